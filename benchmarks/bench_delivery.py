@@ -0,0 +1,103 @@
+# benchmarks/bench_delivery.py
+# ゲートウェイを使わない送信（HTTP API / Webhook）を、ローカルの Discord API の代わりのサーバーに向けて確認・計測する
+#
+# 使い方:
+#   python -m benchmarks.bench_delivery --channels 20 --latency 0.05
+#
+# 代わりのサーバーは local_http で起動し、受け取ったメッセージが送ったものと一致するかを確認する
+# （一致しなければ終了コード 1）
+import io
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import discord_rest
+import local_http
+import notification_core
+import notification_script
+
+# 存在しないチャンネル（404 を返す）への送信が失敗として報告されるかも確認する
+MISSING_CHANNEL_ID = 999999
+
+class FakeDiscordAPI:
+    """Discord の HTTP API の代わり（/channels/{id}/messages と /webhooks/{id}/{token} を受け付ける）"""
+
+    def __init__(self, channel_ids, webhook_ids, latency=0.0):
+        self.latency = latency
+        self.received = {}
+        for channel_id in channel_ids:
+            local_http.route('POST', f'/api/v10/channels/{channel_id}/messages')(
+                self._handler(channel_id, 'Bot fake-token')
+            )
+        for webhook_id in webhook_ids:
+            local_http.route('POST', f'/api/webhooks/{webhook_id}/token')(self._handler(f'webhook{webhook_id}'))
+
+    def _handler(self, target, authorization=None):
+        async def handle(method, path, headers, body):
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            if authorization and headers.get('authorization') != authorization:
+                return 403, 'application/json', json.dumps({'message': 'Missing Access'})
+            content = json.loads(body)['content']
+            self.received[target] = content
+            return 200, 'application/json', json.dumps({'id': '1', 'content': content})
+        return handle
+
+async def run(channels, latency):
+    channel_ids = list(range(1, channels + 1))
+    api = FakeDiscordAPI(channel_ids, channel_ids, latency)
+    server = await local_http.start('127.0.0.1', 0)
+    base = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+    discord_rest.DISCORD_API_BASE = f'{base}/api/v10'
+
+    messages = {channel_id: f'明日は燃えるごみの日です ({channel_id})' for channel_id in channel_ids}
+    webhook_messages = {f'{base}/api/webhooks/{channel_id}/token': text for channel_id, text in messages.items()}
+
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        rest_results = await notification_script.send_via_rest('fake-token', {**messages, MISSING_CHANNEL_ID: 'x'})
+        results['rest_ms'] = round((time.perf_counter() - started) * 1000, 3)
+
+        started = time.perf_counter()
+        webhook_results = await notification_script.send_via_webhook(webhook_messages)
+        results['webhook_ms'] = round((time.perf_counter() - started) * 1000, 3)
+
+    errors = []
+    for channel_id, text in messages.items():
+        if api.received.get(channel_id) != text:
+            errors.append(f'HTTP API: チャンネル {channel_id} に届いていません')
+        if api.received.get(f'webhook{channel_id}') != text:
+            errors.append(f'Webhook: {channel_id} に届いていません')
+    failed = [channel_id for channel_id, error in rest_results.items() if error is not None]
+    if failed != [MISSING_CHANNEL_ID]:
+        errors.append(f'失敗したチャンネルが正しく報告されていません: {failed}')
+    if any(error is not None for error in webhook_results.values()):
+        errors.append('Webhook の送信が失敗として報告されました')
+    return results, errors
+
+def main():
+    parser = argparse.ArgumentParser(description='HTTP API / Webhook 送信の確認と計測')
+    parser.add_argument('--channels', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.0, help='代わりのサーバーの応答の遅延（秒）')
+    args = parser.parse_args()
+
+    # 送信間隔による待ちを計測に含めない
+    notification_core.NOTIFY_RATE_PER_SECOND = 0
+
+    results, errors = asyncio.run(run(args.channels, args.latency))
+    print(f"📮 HTTP API: {results['rest_ms']}ms / Webhook: {results['webhook_ms']}ms ({args.channels}チャンネル)")
+    for error in errors:
+        print(f"❌ {error}")
+    if errors:
+        sys.exit(1)
+    print("✅ すべてのメッセージが届きました")
+
+if __name__ == "__main__":
+    main()
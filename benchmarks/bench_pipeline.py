@@ -0,0 +1,164 @@
+# benchmarks/bench_pipeline.py
+# 予定取得〜通知までの処理時間・メモリ確保量を、カレンダー数・予定数を変えながら計測する
+#
+# 使い方:
+#   python -m benchmarks.bench_pipeline --calendars 1 4 16 --events 10 100 1000 --output bench_results.json
+import io
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import datetime
+import platform
+import statistics
+import tempfile
+import tracemalloc
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import event_store
+import google_calendar
+import notification_core
+from benchmarks.fakes import JST, FakeCalendarService, FakeChannel, FakeCredentials
+
+def install_fakes(service, store_path):
+    """google_calendar が偽のサービスと新しいストアを使うように差し替える"""
+    credentials = FakeCredentials()
+    google_calendar.get_service_account_credentials = lambda: credentials
+    google_calendar.get_calendar_service = lambda _credentials: service
+    if event_store.event_store is not None:
+        event_store.event_store.close()
+    event_store.event_store = event_store.EventStore(store_path)
+
+def measure(func, repeat):
+    """func を repeat 回実行した時間（ミリ秒）と、1回分のメモリ確保量（KB）を返す"""
+    timings = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        func()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'min_ms': round(min(timings), 3),
+        'median_ms': round(statistics.median(timings), 3),
+        'mean_ms': round(statistics.mean(timings), 3),
+        'max_ms': round(max(timings), 3),
+        'alloc_kb': round(current / 1024, 1),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+def run_case(calendars, events, page_size, latency, days, repeat, workdir):
+    """1つの条件（カレンダー数 × 予定数）で各ステージを計測"""
+    service = FakeCalendarService(calendars, events, page_size=page_size, latency=latency)
+    start_date = datetime.datetime.now(JST).date() + datetime.timedelta(days=1)
+    end_date = start_date + datetime.timedelta(days=days - 1)
+    store_path = os.path.join(workdir, f'events_{calendars}_{events}.db')
+    results = {}
+
+    # 初回（全件同期）: 毎回ストアを作り直す
+    def cold_sync():
+        if os.path.exists(store_path):
+            os.remove(store_path)
+        install_fakes(service, store_path)
+        google_calendar.get_google_calendar_events_between(start_date, end_date)
+    results['sync_cold'] = measure(cold_sync, repeat)
+
+    # 2回目以降（差分同期）
+    install_fakes(service, store_path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        google_calendar.get_google_calendar_events_between(start_date, end_date)
+    results['sync_delta'] = measure(
+        lambda: google_calendar.get_google_calendar_events_between(start_date, end_date), repeat
+    )
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        google_days = google_calendar.get_google_calendar_events_between(start_date, end_date)
+        fixed_days = google_calendar.get_fixed_schedule_events_between(start_date, end_date)
+    results['fixed_schedule'] = measure(
+        lambda: google_calendar.get_fixed_schedule_events_between(start_date, end_date), repeat
+    )
+    results['dedup'] = measure(lambda: google_calendar.merge_events_between(google_days, fixed_days), repeat)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        merged = google_calendar.merge_events_between(google_days, fixed_days)
+    current_time = datetime.datetime.now(JST)
+    results['render'] = measure(
+        lambda: [notification_core.render_notification(day, '✅ ハイブリッドシステム', current_time)
+                 for day in merged.values()],
+        repeat
+    )
+
+    channels = {index: FakeChannel(index) for index in range(1, 11)}
+    text = notification_core.render_notification(merged[start_date], '✅ ハイブリッドシステム', current_time)
+
+    async def send(channel_id, content):
+        await channels[channel_id].send(content)
+
+    results['send'] = measure(
+        lambda: asyncio.run(notification_core.deliver_all({index: text for index in channels}, send)),
+        repeat
+    )
+
+    results['end_to_end_tomorrow'] = measure(google_calendar.get_tomorrow_events, repeat)
+
+    return [
+        dict(stage=stage, calendars=calendars, events_per_calendar=events, days=days, **stats)
+        for stage, stats in results.items()
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description='予定取得パイプラインのベンチマーク')
+    parser.add_argument('--calendars', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--events', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--page-size', type=int, default=250)
+    parser.add_argument('--latency', type=float, default=0.0, help='1リクエストあたりの遅延（秒）')
+    parser.add_argument('--days', type=int, default=7, help='取得する日数')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', default='bench_results.json')
+    args = parser.parse_args()
+
+    # 送信間隔による待ちを計測に含めない
+    notification_core.NOTIFY_RATE_PER_SECOND = 0
+
+    rows = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for calendars in args.calendars:
+            for events in args.events:
+                case_rows = run_case(
+                    calendars, events, args.page_size, args.latency, args.days, args.repeat, workdir
+                )
+                rows.extend(case_rows)
+                for row in case_rows:
+                    print(f"{row['stage']:<22} cal={calendars:<3} evt={events:<5} "
+                          f"median={row['median_ms']:>9.3f}ms peak={row['peak_kb']:>9.1f}KB")
+        if event_store.event_store is not None:
+            event_store.event_store.close()
+            event_store.event_store = None
+
+    report = {
+        'meta': {
+            'timestamp': datetime.datetime.now(JST).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'page_size': args.page_size,
+            'latency': args.latency,
+            'repeat': args.repeat,
+        },
+        'results': rows,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"📊 結果を保存しました: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+# benchmarks/fakes.py
+# ベンチマーク・負荷試験用の Google Calendar / Discord の代替実装（プロセス内で完結する）
+import json
+import time
+import datetime
+import itertools
+
+JST = datetime.timezone(datetime.timedelta(hours=9))
+
+SAMPLE_SUMMARIES = [
+    '燃えるごみ', 'プラスチックごみ', '瓶・缶・ペットボトルごみ', '紙ごみ',
+    '粗大ごみ', '町内会', '病院', '買い物',
+]
+
+def generate_events(count, days=14, start_date=None, seed=0):
+    """明日から days 日間に散らばった予定を生成"""
+    start_date = start_date or datetime.datetime.now(JST).date() + datetime.timedelta(days=1)
+    events = []
+    for i in range(count):
+        date = start_date + datetime.timedelta(days=(i + seed) % days)
+        summary = SAMPLE_SUMMARIES[(i * 7 + seed) % len(SAMPLE_SUMMARIES)]
+        if i % 3 == 0:
+            start = {'date': date.isoformat()}
+        else:
+            start_time = datetime.datetime.combine(date, datetime.time(7 + i % 12)).replace(tzinfo=JST)
+            start = {'dateTime': start_time.isoformat()}
+        events.append({
+            'id': f'evt{seed}_{i}',
+            'status': 'confirmed',
+            'summary': summary,
+            'start': start,
+            'description': 'x' * 200,
+        })
+    return events
+
+class FakeRequest:
+    """googleapiclient の HttpRequest の代わり（execute で遅延を入れて応答を返す）"""
+
+    def __init__(self, service, response_factory):
+        self.service = service
+        self._response_factory = response_factory
+        self.headers = {'user-agent': 'fake'}
+
+    def execute(self, http=None, num_retries=0):
+        self.service.request_count += 1
+        if self.service.latency:
+            time.sleep(self.service.latency)
+        return self._response_factory()
+
+class _CalendarListResource:
+    def __init__(self, service):
+        self.service = service
+
+    def list(self, **params):
+        return FakeRequest(self.service, lambda: {'items': [
+            {'id': calendar_id, 'summary': f'カレンダー{index}', 'accessRole': 'reader'}
+            for index, calendar_id in enumerate(self.service.events_by_calendar)
+        ]})
+
+class _EventsResource:
+    def __init__(self, service):
+        self.service = service
+
+    def list(self, calendarId, pageToken=None, syncToken=None, maxResults=250, **params):
+        def respond():
+            if syncToken is not None:
+                # 差分同期: 変更なし
+                return {'items': [], 'nextSyncToken': syncToken}
+            events = self.service.events_by_calendar.get(calendarId, [])
+            page_size = min(maxResults, self.service.page_size)
+            offset = int(pageToken or 0)
+            response = {'items': events[offset:offset + page_size]}
+            if offset + page_size < len(events):
+                response['nextPageToken'] = str(offset + page_size)
+            else:
+                response['nextSyncToken'] = f'sync-{calendarId}-{len(events)}'
+            return response
+        return FakeRequest(self.service, respond)
+
+def load_fixture(path):
+    """benchmarks.loadgen record で保存した Calendar API の応答を読み込む 戻り値: {カレンダーID: [予定]}"""
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)['calendars']
+
+class FakeCalendarService:
+    """
+    Calendar v3 サービスの代わり
+    calendars 個のカレンダーに events_per_calendar 件ずつ予定を持ち、page_size 件ずつページ分割して返す
+    latency は1リクエストあたりの遅延（秒）
+    events_by_calendar を渡すと生成した予定の代わりにそれを返す（記録した応答の再生）
+    """
+
+    def __init__(self, calendars=4, events_per_calendar=50, page_size=250, latency=0.0, events_by_calendar=None):
+        self.page_size = page_size
+        self.latency = latency
+        self.request_count = 0
+        if events_by_calendar is None:
+            events_by_calendar = {
+                f'calendar{index}@example.com': generate_events(events_per_calendar, seed=index)
+                for index in range(calendars)
+            }
+        self.events_by_calendar = events_by_calendar
+
+    def calendarList(self):
+        return _CalendarListResource(self)
+
+    def events(self):
+        return _EventsResource(self)
+
+class FakeCredentials:
+    """認証情報の代わり（何もしない）"""
+    valid = True
+    expired = False
+    token = 'fake-token'
+
+    def before_request(self, request, method, url, headers):
+        headers['authorization'] = f'Bearer {self.token}'
+
+    def refresh(self, request):
+        pass
+
+class FakeChannel:
+    """Discord のチャンネルの代わり（送信内容と送信時刻を記録する）"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, channel_id=None, name='fake-channel', latency=0.0):
+        self.id = channel_id or next(self._ids)
+        self.name = name
+        self.latency = latency
+        self.sent = []
+
+    async def send(self, content=None, **kwargs):
+        import asyncio
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.sent.append((time.perf_counter(), content))
+        return content
+
+class FakePermissions:
+    def __init__(self, manage_guild=False):
+        self.manage_guild = manage_guild
+
+class FakeUser:
+    """Discord のユーザー・メンバーの代わり"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, user_id=None, name='fake-user', manage_guild=False):
+        self.id = user_id or next(self._ids)
+        self.name = name
+        self.guild_permissions = FakePermissions(manage_guild)
+
+class FakeGuild:
+    """Discord のサーバーの代わり"""
+
+    def __init__(self, guild_id, name='fake-guild'):
+        self.id = guild_id
+        self.name = name
+
+class FakeMessage:
+    """Discord のメッセージの代わり（on_message に渡す）"""
+
+    def __init__(self, content, author, channel, guild=None, mentions=()):
+        self.content = content
+        self.author = author
+        self.channel = channel
+        self.guild = guild
+        self.mentions = list(mentions)
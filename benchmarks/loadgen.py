@@ -0,0 +1,329 @@
+# benchmarks/loadgen.py
+# discordbot.on_message の負荷試験（Discord・Google には接続しない）
+#
+# 使い方:
+#   実際の Calendar API の応答を記録する（GOOGLE_SERVICE_ACCOUNT_KEY / token.json が必要）
+#     python -m benchmarks.loadgen record --output fixtures/calendar.json
+#   記録した応答（省略時は生成した予定）を再生しながら、メッセージを一定のレートで送り込む
+#     python -m benchmarks.loadgen run --fixture fixtures/calendar.json --rate 200 --duration 30 \
+#         --users 500 --channels 50 --guilds 10 --mix calendar=3,tomorrow=3,week=1,mention=1,chatter=4
+#
+# 返信までの時間（p50/p99）、スループット、イベントループの遅れ（ラグ）を表示し、--output に JSON で保存する
+import io
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import datetime
+import contextvars
+import platform
+import tempfile
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics
+from benchmarks.fakes import (
+    JST, FakeCalendarService, FakeChannel, FakeCredentials, FakeGuild, FakeMessage, FakeUser, load_fixture
+)
+
+DEFAULT_MIX = 'calendar=3,tomorrow=3,week=1,mention=1,chatter=4'
+CHATTER = ['おはようございます', '今日は暑いですね', '了解です', 'ありがとうございます', 'www']
+LAG_INTERVAL = 0.05
+
+# 処理中のメッセージへの返信の件数（メッセージごとのタスクで別の値になる）
+_replies = contextvars.ContextVar('replies')
+
+def count_replies(send_message):
+    """discordbot.send_message を包み、処理中のメッセージへの返信を数える"""
+    async def wrapper(channel, text):
+        _replies.get()[0] += 1
+        await send_message(channel, text)
+    return wrapper
+
+def record(output, calendar_ids=None, primary=False):
+    """Calendar API の応答（Botが同期するときと同じ条件）をファイルに保存する"""
+    from calendar_service import (
+        get_calendar_service, get_service_account_credentials, get_thread_http, get_user_credentials
+    )
+    from event_store import fetch_changes
+
+    credentials = get_service_account_credentials()
+    service = get_calendar_service(credentials)
+    if not calendar_ids:
+        calendar_ids = [calendar['id'] for calendar in service.calendarList().list().execute().get('items', [])]
+
+    calendars = {}
+    for calendar_id in calendar_ids:
+        items, _, _ = fetch_changes(service, calendar_id, http=get_thread_http(credentials))
+        calendars[calendar_id] = items
+        print(f"📥 {calendar_id}: {len(items)}件")
+
+    # !カレンダー が使う primary カレンダー（OAuth のユーザー認証情報）
+    if primary:
+        user_credentials = get_user_credentials()
+        items, _, _ = fetch_changes(
+            get_calendar_service(user_credentials), 'primary', http=get_thread_http(user_credentials)
+        )
+        calendars['primary'] = items
+        print(f"📥 primary: {len(items)}件")
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'recorded_at': datetime.datetime.now(JST).isoformat(),
+            'calendars': calendars,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"💾 応答を保存しました: {output}")
+
+def install_fakes(service, workdir, guilds, regions):
+    """Google Calendar・各ストアを偽のサービスと一時ディレクトリのストアに差し替える"""
+    import calendar_integration
+    import event_store
+    import google_calendar
+    import guild_config
+
+    credentials = FakeCredentials()
+    google_calendar.get_service_account_credentials = lambda: credentials
+    google_calendar.get_calendar_service = lambda _credentials: service
+    calendar_integration.get_user_credentials = lambda: credentials
+    calendar_integration.get_calendar_service = lambda _credentials: service
+    calendar_integration.calendar_bot = None
+    event_store.event_store = event_store.EventStore(os.path.join(workdir, 'events.db'))
+
+    # サーバーごとに地区を割り振る（同じ地区のサーバーは取得結果を共有する）
+    guild_config.guild_store = guild_config.GuildConfigStore(os.path.join(workdir, 'guilds.db'))
+    calendar_ids = [calendar_id for calendar_id in service.events_by_calendar if calendar_id != 'primary']
+    for guild in guilds:
+        region = regions[guild.id % len(regions)]
+        guild_config.guild_store.set(guild.id, channel_id=guild.id, region=region, calendar_ids=calendar_ids)
+
+def parse_mix(value):
+    """'calendar=3,tomorrow=1' → {'calendar': 3.0, 'tomorrow': 1.0}"""
+    mix = {}
+    for item in value.split(','):
+        kind, _, weight = item.partition('=')
+        mix[kind.strip()] = float(weight or 1)
+    return mix
+
+def make_content(kind, bot_user, rng):
+    """メッセージの種類ごとの本文（mention はBot宛てのメンション）"""
+    if kind == 'calendar':
+        return rng.choice(['!カレンダー', '!カレンダー 家庭', '!カレンダー プラスチック', '!カレンダー 紙'])
+    if kind == 'tomorrow':
+        return '!明日'
+    if kind == 'week':
+        return '!週間'
+    if kind == 'mention':
+        return rng.choice([f'<@{bot_user.id}> すごい', f'<@{bot_user.id}> !明日'])
+    return rng.choice(CHATTER)
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(q / 100 * len(values)) - 1))
+    return values[index]
+
+def summarize(values):
+    """秒の一覧 → ミリ秒の統計"""
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'p50_ms': round(percentile(values, 50) * 1000, 3),
+        'p99_ms': round(percentile(values, 99) * 1000, 3),
+        'max_ms': round(max(values) * 1000, 3),
+    }
+
+async def monitor_loop_lag(lags, stop):
+    """一定間隔で眠り、予定より遅れて起きた時間をイベントループのラグとして記録する"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(LAG_INTERVAL)
+        lags.append(max(0.0, time.perf_counter() - started - LAG_INTERVAL))
+
+async def drive(discordbot, rate, duration, users, channels, guilds, mix, seed):
+    """rate 件/秒でメッセージを on_message に送り込み、1件ごとの処理時間を記録する"""
+    rng = random.Random(seed)
+    bot_user = FakeUser(name='gomidasi-bot')
+    discordbot.client._connection.user = bot_user
+    discordbot.send_message = count_replies(discordbot.send_message)
+    kinds, weights = zip(*mix.items())
+
+    results = {kind: [] for kind in kinds}
+    replied = {kind: [] for kind in kinds}
+    errors = []
+    lags = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(monitor_loop_lag(lags, stop))
+
+    async def handle(kind, message):
+        replies = [0]
+        _replies.set(replies)
+        started = time.perf_counter()
+        try:
+            await discordbot.on_message(message)
+        except Exception as e:
+            errors.append(f'{kind}: {e}')
+            return
+        elapsed = time.perf_counter() - started
+        results[kind].append(elapsed)
+        if replies[0]:
+            replied[kind].append(elapsed)
+
+    # 到着間隔は指数分布（開ループ: 処理が遅れても送り込むレートは変えない）
+    tasks = []
+    started = time.perf_counter()
+    next_at = started
+    while next_at - started < duration:
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        kind = rng.choices(kinds, weights)[0]
+        channel = rng.choice(channels)
+        message = FakeMessage(
+            make_content(kind, bot_user, rng), rng.choice(users), channel,
+            guild=guilds[channel.id % len(guilds)] if guilds else None,
+            mentions=[bot_user] if kind == 'mention' else [],
+        )
+        tasks.append(asyncio.create_task(handle(kind, message)))
+        next_at += rng.expovariate(rate)
+    sent_duration = time.perf_counter() - started
+
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await monitor
+
+    all_replied = [value for values in replied.values() for value in values]
+    return {
+        'messages': len(tasks),
+        'replies': len(all_replied),
+        'errors': len(errors),
+        'error_samples': errors[:5],
+        'offered_rate': round(len(tasks) / sent_duration, 2),
+        'throughput': round(sum(len(values) for values in results.values()) / elapsed, 2),
+        'elapsed_s': round(elapsed, 3),
+        'reply_latency': summarize(all_replied),
+        'by_kind': {kind: summarize(values) for kind, values in replied.items()},
+        'handled_latency': {kind: summarize(values) for kind, values in results.items()},
+        'loop_lag': summarize(lags),
+    }
+
+def run(args):
+    import discordbot
+    import outbound_queue
+    import google_calendar
+    import notification_core
+    from response_cache import response_cache
+    from schedule_rules import get_regions
+
+    if args.fixture:
+        service = FakeCalendarService(events_by_calendar=load_fixture(args.fixture), latency=args.latency)
+        # primary を記録していなければ最初のカレンダーで代用する
+        service.events_by_calendar.setdefault('primary', next(iter(service.events_by_calendar.values()), []))
+    else:
+        service = FakeCalendarService(args.calendars, args.events, latency=args.latency)
+        service.events_by_calendar['primary'] = next(iter(service.events_by_calendar.values()))
+    response_cache.ttl = args.cache_ttl
+    if args.coalesce_window is not None:
+        outbound_queue.outbound_queue.window = args.coalesce_window
+    notification_core.NOTIFY_RATE_PER_SECOND = 0
+    metrics.enable()
+
+    channels = [FakeChannel(index, latency=args.send_latency) for index in range(1, args.channels + 1)]
+    users = [FakeUser(100000 + index) for index in range(args.users)]
+    guilds = [FakeGuild(index) for index in range(1, args.guilds + 1)]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        install_fakes(service, workdir, guilds, get_regions())
+        # 最初の同期（全件）は計測に含めない
+        with contextlib.redirect_stdout(io.StringIO()):
+            google_calendar.get_tomorrow_events()
+        metrics.reset()
+        requests_before = service.request_count
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            report = asyncio.run(drive(
+                discordbot, args.rate, args.duration, users, channels, guilds, parse_mix(args.mix), args.seed
+            ))
+        report['google_requests'] = service.request_count - requests_before
+        report['metrics'] = metrics.snapshot()
+
+    report['meta'] = {
+        'timestamp': datetime.datetime.now(JST).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'fixture': args.fixture,
+        'rate': args.rate,
+        'duration': args.duration,
+        'users': args.users,
+        'channels': args.channels,
+        'guilds': args.guilds,
+        'mix': args.mix,
+        'latency': args.latency,
+        'send_latency': args.send_latency,
+        'cache_ttl': args.cache_ttl,
+        'coalesce_window': outbound_queue.outbound_queue.window,
+    }
+    return report
+
+def print_report(report):
+    reply = report['reply_latency']
+    lag = report['loop_lag']
+    print(f"📨 メッセージ: {report['messages']}件 (送信レート {report['offered_rate']}/秒) "
+          f"返信: {report['replies']}件 エラー: {report['errors']}件")
+    print(f"⚡ スループット: {report['throughput']}件/秒 / Google へのリクエスト: {report['google_requests']}回")
+    if reply['count']:
+        print(f"⏱️ 返信までの時間: p50={reply['p50_ms']}ms p99={reply['p99_ms']}ms max={reply['max_ms']}ms")
+    for kind, stats in report['by_kind'].items():
+        if stats['count']:
+            print(f"   {kind:<10} n={stats['count']:<6} p50={stats['p50_ms']:>9.3f}ms p99={stats['p99_ms']:>9.3f}ms")
+    if lag['count']:
+        print(f"🐢 イベントループのラグ: p50={lag['p50_ms']}ms p99={lag['p99_ms']}ms max={lag['max_ms']}ms")
+    for sample in report['error_samples']:
+        print(f"❌ {sample}")
+
+def main():
+    parser = argparse.ArgumentParser(description='discordbot.on_message の負荷試験')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = subparsers.add_parser('record', help='Calendar API の応答を記録する')
+    record_parser.add_argument('--output', default='fixtures/calendar.json')
+    record_parser.add_argument('--calendar-ids', nargs='*', help='省略するとアクセスできるすべてのカレンダー')
+    record_parser.add_argument('--primary', action='store_true', help='token.json のユーザーの primary カレンダーも記録する')
+
+    run_parser = subparsers.add_parser('run', help='記録した応答を再生しながら負荷をかける')
+    run_parser.add_argument('--fixture', help='record で保存したファイル（省略すると生成した予定を使う）')
+    run_parser.add_argument('--calendars', type=int, default=4)
+    run_parser.add_argument('--events', type=int, default=100)
+    run_parser.add_argument('--rate', type=float, default=100, help='1秒あたりのメッセージ数')
+    run_parser.add_argument('--duration', type=float, default=10, help='送り込む時間（秒）')
+    run_parser.add_argument('--users', type=int, default=200)
+    run_parser.add_argument('--channels', type=int, default=20)
+    run_parser.add_argument('--guilds', type=int, default=5)
+    run_parser.add_argument('--mix', default=DEFAULT_MIX, help='メッセージの種類と比率')
+    run_parser.add_argument('--latency', type=float, default=0.05, help='Calendar API 1リクエストあたりの遅延（秒）')
+    run_parser.add_argument('--send-latency', type=float, default=0.05, help='Discord への送信1回あたりの遅延（秒）')
+    run_parser.add_argument('--coalesce-window', type=float, help='送信キューでまとめる待ち時間（秒、省略時は OUTBOUND_COALESCE_SECONDS）')
+    run_parser.add_argument('--cache-ttl', type=float, default=600, help='応答キャッシュの有効期限（0 でキャッシュしない）')
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--output', default='loadgen_results.json')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        record(args.output, args.calendar_ids, args.primary)
+        return
+
+    report = run(args)
+    print_report(report)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"📊 結果を保存しました: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# calendar_async.py
+# Discordのイベントループを止めないためのカレンダーAPI非同期ラッパー
+import os
+import time
+import asyncio
+import datetime
+import functools
+import metrics
+from event_store import EVENT_STORE_PATH, get_event_store
+from response_cache import invalidate_all, response_cache
+from calendar_integration import get_calendar_bot
+from guild_config import DEFAULT_DISTRICT
+from calendar_service import google_status, set_google_status
+from google_calendar import get_events_between, get_tomorrow_events
+
+# 実行中の上流リクエスト（同じキーの同時リクエストは1回の取得を共有する）
+_inflight = {}
+
+def _timed(name, func, *args):
+    with metrics.stage(f'calendar_async.{name}'):
+        return func(*args)
+
+def _with_google_status(func, *args):
+    """結果と、その取得中の Google Calendar の状態を返す（同じスレッドで確認する）"""
+    set_google_status('ok')
+    return func(*args), google_status()
+
+async def _coalesced(key, func, *args):
+    """同じキーの処理が実行中ならその結果を待ち、なければスレッドプールで実行する"""
+    future = _inflight.get(key)
+    if future is None:
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(None, functools.partial(_timed, key[0], func, *args))
+        _inflight[key] = future
+        future.add_done_callback(lambda _: _inflight.pop(key, None))
+    else:
+        metrics.incr('calendar_async.coalesced')
+    # 待機側がキャンセルされても共有中の取得は止めない
+    return await asyncio.shield(future)
+
+JST = datetime.timezone(datetime.timedelta(hours=9))
+
+_MISSING = object()
+
+# 別のプロセスでのカレンダーの変更を確認する間隔（秒）
+STORE_INVALIDATION_POLL_SECONDS = float(os.getenv('STORE_INVALIDATION_POLL_SECONDS', '5'))
+
+# 最後に確認したローカルストアの invalidated_at と、確認した時刻
+_store_invalidated_at = None
+_store_checked_at = 0.0
+
+def _read_store_invalidated_at():
+    if not os.path.exists(EVENT_STORE_PATH):
+        return None
+    return get_event_store().invalidated_at()
+
+def _apply_store_invalidation(future):
+    global _store_invalidated_at
+    if future.cancelled() or future.exception() is not None:
+        return
+    invalidated_at = future.result()
+    if invalidated_at is None:
+        return
+    if _store_invalidated_at is not None and invalidated_at != _store_invalidated_at:
+        invalidate_all("別のプロセスがカレンダーの変更を受信")
+    _store_invalidated_at = invalidated_at
+
+def _poll_store_invalidation():
+    """
+    別のプロセスがローカルストアを mark_stale していたら応答キャッシュを破棄する
+    変更通知はシャード0のプロセスだけが受け取るので、他のワーカーはこれで反映する
+    （確認は STORE_INVALIDATION_POLL_SECONDS 秒に1回、イベントループを止めないようスレッドプールで行う）
+    """
+    global _store_checked_at
+    now = time.monotonic()
+    if now - _store_checked_at < STORE_INVALIDATION_POLL_SECONDS:
+        return
+    _store_checked_at = now
+    future = asyncio.get_running_loop().run_in_executor(None, _read_store_invalidated_at)
+    future.add_done_callback(_apply_store_invalidation)
+
+async def _cached(key, func, *args):
+    """応答キャッシュにあればそれを返し、なければ取得してキャッシュする"""
+    _poll_store_invalidation()
+    value = response_cache.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+    generation = response_cache.generation
+    value, status = await _coalesced(key, _with_google_status, func, *args)
+    # 保存済みの予定で代替した結果はキャッシュしない（次の問い合わせで同期し直す）
+    if status == 'ok':
+        response_cache.set(key, value, generation)
+    else:
+        metrics.incr('calendar_async.degraded')
+    return value
+
+async def get_tomorrow_events_async(district=DEFAULT_DISTRICT):
+    """get_tomorrow_events の非同期版（同じ地区キーのサーバーは結果を共有する）"""
+    # 日付が変わったら別のキーになる
+    tomorrow = datetime.datetime.now(JST).date() + datetime.timedelta(days=1)
+    return await _cached(('tomorrow', tomorrow, district), get_tomorrow_events, *district)
+
+async def get_events_between_async(start_date, end_date, district=DEFAULT_DISTRICT):
+    """get_events_between の非同期版（日付ごとの予定を返す）"""
+    return await _cached(
+        ('between', start_date, end_date, district), get_events_between, start_date, end_date, *district
+    )
+
+async def get_calendar_bot_async():
+    """CalendarBot を取得（初回の認証もイベントループ外で行う）"""
+    return await _coalesced(('calendar_bot',), get_calendar_bot)
+
+async def get_next_event_async(event_type=None):
+    """CalendarBot.get_next_event / get_event_by_type の非同期版"""
+    calendar_bot = await get_calendar_bot_async()
+    if event_type:
+        return await _cached(('next_event', event_type), calendar_bot.get_event_by_type, event_type)
+    return await _cached(('next_event', None), calendar_bot.get_next_event)
@@ -1,68 +1,73 @@
-import os
-import json
 from datetime import datetime, timedelta
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+from google.auth.exceptions import GoogleAuthError
 from googleapiclient.errors import HttpError
+from calendar_service import (
+    USER_SCOPES, get_calendar_service, get_thread_http, get_user_credentials, set_google_status,
+    user_calendar_breaker
+)
+from event_store import JST, USER_CALENDAR_ID, get_event_store, sync_calendar
+
+# コマンドで指定する種類 → 予定の件名
+EVENT_TYPES = {
+    "家庭": "家庭ごみ",
+    "プラスチック": "プラスチックごみ", 
+    "紙": "紙ごみ"
+}
+
+# 同期に失敗しても保存済みの予定で応答するエラー（token.json の失効などの認証エラーを含む）
+SYNC_ERRORS = (HttpError, OSError, GoogleAuthError)
+
+def resolve_event_type(event_type):
+    """コマンドで指定された種類を予定の件名に変換（未登録の種類はそのまま）"""
+    return EVENT_TYPES.get(event_type, event_type)
 
 class CalendarBot:
     """Discord Bot用のGoogle Calendar統合クラス"""
     
-    SCOPES = ['https://www.googleapis.com/auth/calendar']
+    SCOPES = USER_SCOPES
+    CALENDAR_ID = USER_CALENDAR_ID
     
     def __init__(self):
         self.service = None
+        self.credentials = None
         self.authenticate()
     
     def authenticate(self):
-        """Google Calendar APIの認証を行う"""
-        creds = None
-        
-        if os.path.exists('token.json'):
-            creds = Credentials.from_authorized_user_file('token.json', self.SCOPES)
-        
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-            else:
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    'credentials.json', self.SCOPES)
-                creds = flow.run_local_server(port=0)
-            
-            with open('token.json', 'w') as token:
-                token.write(creds.to_json())
-        
-        self.service = build('calendar', 'v3', credentials=creds)
+        """Google Calendar APIの認証を行う（共有の認証情報マネージャーとサービスを再利用）"""
+        self.credentials = get_user_credentials()
+        self.service = get_calendar_service(self.credentials)
+    
+    def sync(self):
+        """
+        primaryカレンダーの変更分をローカルストアに反映する（タイムアウト付き）
+        サーキットブレーカーが開いている間は同期せず、保存済みの予定を使う
+        （認証エラーは Google の障害ではないので、サーキットブレーカーの失敗には数えない）
+        """
+        if not user_calendar_breaker.allow():
+            set_google_status('circuit_open')
+            return False
+        try:
+            sync_calendar(
+                get_event_store(), self.service, self.CALENDAR_ID, http=get_thread_http(self.credentials)
+            )
+        except GoogleAuthError:
+            user_calendar_breaker.release()
+            raise
+        except Exception:
+            user_calendar_breaker.record_failure()
+            raise
+        user_calendar_breaker.record_success()
+        return True
     
     def get_next_event(self, event_type=None):
-        """次のイベントを取得する"""
+        """次のイベントを取得する（差分同期後、ローカルストアから検索。同期できなければ保存済みの予定から）"""
         try:
-            now = datetime.utcnow().isoformat() + 'Z'
-            
-            query = {}
-            if event_type:
-                query['q'] = event_type
-            
-            events_result = self.service.events().list(
-                calendarId='primary',
-                timeMin=now,
-                maxResults=1,
-                singleEvents=True,
-                orderBy='startTime',
-                showDeleted=False,
-                **query
-            ).execute()
-            
-            events = events_result.get('items', [])
-            if events:
-                return events[0]
-            return None
-            
-        except HttpError as error:
+            self.sync()
+        except SYNC_ERRORS as error:
             print(f'An error occurred: {error}')
-            return None
+            set_google_status('error')
+        
+        return get_event_store().next_event(self.CALENDAR_ID, query=event_type)
     
     def format_event_message(self, event):
         """イベント情報をメッセージ形式にフォーマットする"""
@@ -84,27 +89,15 @@ class CalendarBot:
         return f"次の{summary}は{date_str}です"
     
     def check_tomorrow_events(self):
-        """明日のイベントをチェックする"""
+        """明日のイベントをチェックする（差分同期後、ローカルストアから検索）"""
         try:
-            tomorrow = datetime.now() + timedelta(days=1)
-            tomorrow_start = tomorrow.replace(hour=0, minute=0, second=0, microsecond=0)
-            tomorrow_end = tomorrow.replace(hour=23, minute=59, second=59, microsecond=999999)
-            
-            events_result = self.service.events().list(
-                calendarId='primary',
-                timeMin=tomorrow_start.isoformat() + 'Z',
-                timeMax=tomorrow_end.isoformat() + 'Z',
-                singleEvents=True,
-                orderBy='startTime',
-                showDeleted=False
-            ).execute()
-            
-            events = events_result.get('items', [])
-            return events
-            
-        except HttpError as error:
+            self.sync()
+        except SYNC_ERRORS as error:
             print(f'An error occurred: {error}')
-            return []
+            set_google_status('error')
+        
+        tomorrow = datetime.now(JST).date() + timedelta(days=1)
+        return get_event_store().events_between(tomorrow, tomorrow, [self.CALENDAR_ID])
     
     def format_tomorrow_notification(self):
         """翌日の予定通知をフォーマットする"""
@@ -122,13 +115,7 @@ class CalendarBot:
     
     def get_event_by_type(self, event_type):
         """特定のタイプのイベントを取得する"""
-        event_types = {
-            "家庭": "家庭ごみ",
-            "プラスチック": "プラスチックごみ", 
-            "紙": "紙ごみ"
-        }
-        
-        query = event_types.get(event_type, event_type)
+        query = resolve_event_type(event_type)
         return self.get_next_event(query)
 
 # グローバルインスタンス
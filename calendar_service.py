@@ -0,0 +1,327 @@
+# calendar_service.py
+# Google Calendar API のサービス・認証情報をプロセス全体で共有するためのプロバイダ
+#
+# 認証情報はここで一元管理する:
+#   - アクセストークンは期限が近づく前にバックグラウンドで更新する（コマンド処理中に更新を待たない）
+#   - token.json やトークンキャッシュは一時ファイルに書いてから rename で置き換える
+#   - 取得したアクセストークンと期限はトークンキャッシュに保存し、他のプロセスと共有する
+import os
+import json
+import time
+import datetime
+import tempfile
+import threading
+import metrics
+from circuit_breaker import CircuitBreaker
+
+SERVICE_ACCOUNT_SCOPES = ["https://www.googleapis.com/auth/calendar.readonly"]
+USER_SCOPES = ['https://www.googleapis.com/auth/calendar']
+
+TOKEN_PATH = os.getenv('GOOGLE_TOKEN_PATH', 'token.json')
+CLIENT_SECRETS_PATH = os.getenv('GOOGLE_CLIENT_SECRETS_PATH', 'credentials.json')
+TOKEN_CACHE_PATH = os.getenv('GOOGLE_TOKEN_CACHE_PATH', '.token_cache.json')
+
+# events.list で取得する項目（部分レスポンス）と1ページの件数（API の上限）
+EVENT_LIST_FIELDS = 'nextPageToken,nextSyncToken,items(id,status,summary,start,end)'
+EVENT_LIST_PAGE_SIZE = 2500
+
+# Google API 呼び出しのタイムアウト秒数
+GOOGLE_HTTP_TIMEOUT = float(os.getenv('GOOGLE_CALENDAR_TIMEOUT', '10'))
+
+# Google API が続けて失敗したら、しばらく呼び出さずにローカルの予定で答える
+google_breaker = CircuitBreaker(
+    'google',
+    failure_threshold=int(os.getenv('GOOGLE_BREAKER_FAILURES', '3')),
+    reset_seconds=float(os.getenv('GOOGLE_BREAKER_RESET_SECONDS', '60')),
+)
+# CalendarBot（OAuth のユーザー認証情報）の同期用（サービスアカウントの同期とは別に数える）
+user_calendar_breaker = CircuitBreaker(
+    'google_user',
+    failure_threshold=int(os.getenv('GOOGLE_BREAKER_FAILURES', '3')),
+    reset_seconds=float(os.getenv('GOOGLE_BREAKER_RESET_SECONDS', '60')),
+)
+
+# 期限のこの秒数前になったら更新する
+REFRESH_MARGIN_SECONDS = 300
+# 更新に失敗した場合の再試行間隔
+REFRESH_RETRY_SECONDS = 60
+
+_lock = threading.Lock()
+# 認証情報の初回構築用（トークンの更新で通信するので _lock とは分け、イベントループ側が待たないようにする）
+_credentials_lock = threading.Lock()
+_discovery_document = None
+_service_account_credentials = None
+_user_credentials = None
+_services = {}
+# キャッシュのキー → 認証情報（バックグラウンド更新の対象）
+_managed = {}
+_refresh_thread = None
+_thread_local = threading.local()
+
+# 直近の Google Calendar 取得の状態（スレッドごと）: ok / timeout / circuit_open / error
+GOOGLE_STATUS_LABELS = {'timeout': '応答なし', 'circuit_open': '一時停止中', 'error': 'エラー'}
+
+def google_status():
+    """このスレッドで直近に行った Google Calendar 取得の状態"""
+    return getattr(_thread_local, 'google_status', 'ok')
+
+def set_google_status(status):
+    _thread_local.google_status = status
+
+def write_file_atomic(path, content):
+    """一時ファイルに書き込んでから rename で置き換える（読み手が書きかけのファイルを見ない）"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temp_path, 0o600)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def _read_token_cache():
+    try:
+        with open(TOKEN_CACHE_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _load_cached_token(key, creds):
+    """他のプロセスが取得した有効なアクセストークンがあれば使う"""
+    entry = _read_token_cache().get(key)
+    if not entry:
+        return False
+    expiry = datetime.datetime.fromisoformat(entry['expiry'])
+    if (expiry - datetime.datetime.utcnow()).total_seconds() <= REFRESH_MARGIN_SECONDS:
+        return False
+    creds.token = entry['token']
+    creds.expiry = expiry
+    return True
+
+def _save_cached_token(key, creds):
+    """アクセストークンと期限をトークンキャッシュに保存"""
+    if not creds.token or not creds.expiry:
+        return
+    cache = _read_token_cache()
+    now = datetime.datetime.utcnow()
+    # 期限切れのエントリは捨てる
+    cache = {
+        cache_key: entry for cache_key, entry in cache.items()
+        if datetime.datetime.fromisoformat(entry['expiry']) > now
+    }
+    cache[key] = {'token': creds.token, 'expiry': creds.expiry.isoformat()}
+    try:
+        write_file_atomic(TOKEN_CACHE_PATH, json.dumps(cache))
+    except OSError as e:
+        print(f"⚠️ トークンキャッシュ保存エラー: {e}")
+
+def _refresh_request():
+    import httplib2
+    from google_auth_httplib2 import Request
+    return Request(httplib2.Http(timeout=GOOGLE_HTTP_TIMEOUT))
+
+def _seconds_until_refresh(creds):
+    if not creds.token or not creds.expiry:
+        return 0
+    return (creds.expiry - datetime.datetime.utcnow()).total_seconds() - REFRESH_MARGIN_SECONDS
+
+def refresh_credentials(key, creds, force=False):
+    """必要ならアクセストークンを更新して保存する"""
+    if not force and _seconds_until_refresh(creds) > 0:
+        return False
+    # 他のプロセスが既に更新していればそれを使う
+    if not force and _load_cached_token(key, creds):
+        return False
+    with metrics.stage('auth.refresh'):
+        creds.refresh(_refresh_request())
+    _save_cached_token(key, creds)
+    if key.startswith('user:'):
+        write_file_atomic(TOKEN_PATH, creds.to_json())
+    print(f"🔑 アクセストークンを更新しました ({key.split(':', 1)[0]})")
+    return True
+
+def _manage(key, creds):
+    """認証情報をバックグラウンド更新の対象にし、使える状態にしておく"""
+    _load_cached_token(key, creds)
+    refresh_credentials(key, creds)
+    with _lock:
+        _managed[key] = creds
+
+def get_service_account_credentials():
+    """GOOGLE_SERVICE_ACCOUNT_KEY からサービスアカウント認証情報を取得（初回のみ構築）"""
+    global _service_account_credentials
+    if _service_account_credentials is not None:
+        return _service_account_credentials
+    with _credentials_lock:
+        if _service_account_credentials is None:
+            service_account_key = os.getenv('GOOGLE_SERVICE_ACCOUNT_KEY')
+            if not service_account_key:
+                print("⚠️ GOOGLE_SERVICE_ACCOUNT_KEY が設定されていません")
+                return None
+
+            from google.oauth2 import service_account
+
+            service_account_info = json.loads(service_account_key)
+            print(f"✅ サービスアカウント: {service_account_info.get('client_email', 'Unknown')}")
+
+            creds = service_account.Credentials.from_service_account_info(
+                service_account_info, scopes=SERVICE_ACCOUNT_SCOPES
+            )
+            _manage(f"service_account:{service_account_info.get('client_email', '')}", creds)
+            _service_account_credentials = creds
+        return _service_account_credentials
+
+def load_user_credentials():
+    """token.json からユーザー認証情報を読み込む（スコープは token.json に記録されたものを使う）"""
+    from google.oauth2.credentials import Credentials
+
+    if not os.path.exists(TOKEN_PATH):
+        return None
+    return Credentials.from_authorized_user_file(TOKEN_PATH)
+
+def get_user_credentials():
+    """token.json（OAuth）からユーザー認証情報を取得（初回のみ読み込み）"""
+    global _user_credentials
+    if _user_credentials is not None:
+        return _user_credentials
+    with _credentials_lock:
+        if _user_credentials is None:
+            creds = load_user_credentials()
+            if creds is None or not (creds.valid or creds.refresh_token):
+                raise RuntimeError(
+                    f"{TOKEN_PATH} がないか無効です。python token_refresh.py --authorize で認証してください"
+                )
+            _manage(f"user:{creds.client_id}", creds)
+            _user_credentials = creds
+        return _user_credentials
+
+def run_authorization_flow():
+    """ブラウザで OAuth 認証を行い token.json を作成する（対話的な初回設定用）"""
+    from google_auth_oauthlib.flow import InstalledAppFlow
+
+    flow = InstalledAppFlow.from_client_secrets_file(CLIENT_SECRETS_PATH, USER_SCOPES)
+    creds = flow.run_local_server(port=0)
+    write_file_atomic(TOKEN_PATH, creds.to_json())
+    _save_cached_token(f"user:{creds.client_id}", creds)
+    return creds
+
+def _refresh_loop():
+    while True:
+        with _lock:
+            managed = list(_managed.items())
+        delay = REFRESH_MARGIN_SECONDS
+        for key, creds in managed:
+            try:
+                refresh_credentials(key, creds)
+                delay = min(delay, max(_seconds_until_refresh(creds), REFRESH_RETRY_SECONDS))
+            except Exception as e:
+                print(f"⚠️ アクセストークン更新エラー ({key.split(':', 1)[0]}): {e}")
+                metrics.incr('auth.refresh.errors')
+                delay = min(delay, REFRESH_RETRY_SECONDS)
+        time.sleep(delay)
+
+def start_background_refresh():
+    """アクセストークンを期限前に更新し続けるスレッドを起動（常駐プロセス用、起動済みなら何もしない）"""
+    global _refresh_thread
+    with _lock:
+        if _refresh_thread is None:
+            _refresh_thread = threading.Thread(target=_refresh_loop, name='credential-refresh', daemon=True)
+            _refresh_thread.start()
+
+def _get_discovery_document():
+    """Calendar v3 のディスカバリドキュメントを取得（ライブラリ同梱のローカルキャッシュを1回だけ読み込む）"""
+    global _discovery_document
+    if _discovery_document is None:
+        from googleapiclient.discovery_cache import get_static_doc
+        document = get_static_doc("calendar", "v3")
+        if document:
+            _discovery_document = json.loads(document)
+    return _discovery_document
+
+def get_calendar_service(credentials):
+    """
+    認証情報ごとに Calendar サービスを1回だけ構築して再利用する
+    アクセストークンはバックグラウンドで更新され、期限切れの場合も AuthorizedHttp がその場で更新する
+    """
+    key = id(credentials)
+    with _lock:
+        service = _services.get(key)
+        if service is None:
+            from googleapiclient.discovery import build, build_from_document
+
+            document = _get_discovery_document()
+            if document is not None:
+                service = build_from_document(document, credentials=credentials)
+            else:
+                service = build("calendar", "v3", credentials=credentials, cache_discovery=False)
+            _services[key] = service
+        return service
+
+def get_thread_http(credentials, timeout=GOOGLE_HTTP_TIMEOUT):
+    """スレッドごとのタイムアウト付きHTTPトランスポートを取得（httplib2はスレッドセーフではないため）"""
+    transports = getattr(_thread_local, 'transports', None)
+    if transports is None:
+        transports = _thread_local.transports = {}
+    http = transports.get(id(credentials))
+    if http is None or http.credentials is not credentials:
+        import httplib2
+        from google_auth_httplib2 import AuthorizedHttp
+        http = AuthorizedHttp(credentials, http=httplib2.Http(timeout=timeout))
+        transports[id(credentials)] = http
+    return http
+
+def _enable_gzip(request):
+    """gzip 圧縮したレスポンスを要求する（Google は User-Agent に gzip を含む場合のみ圧縮する）"""
+    headers = getattr(request, 'headers', None)
+    if headers is None:
+        return
+    headers['accept-encoding'] = 'gzip'
+    user_agent = headers.get('user-agent', '')
+    if 'gzip' not in user_agent:
+        headers['user-agent'] = f"{user_agent} (gzip)".strip()
+
+class EventListing:
+    """
+    events.list の全ページを順に返すイテレータ
+    ページは必要になった時点で取得し、必要な項目だけを gzip で受け取る
+    最後まで読み終えると next_sync_token に次回の差分同期用トークンが入る
+    """
+
+    def __init__(self, service, http=None, fields=EVENT_LIST_FIELDS, **params):
+        self.service = service
+        self.http = http
+        self.fields = fields
+        self.params = params
+        self.params.setdefault('maxResults', EVENT_LIST_PAGE_SIZE)
+        self.next_sync_token = None
+        self.pages = 0
+
+    def __iter__(self):
+        page_token = None
+        while True:
+            params = dict(self.params)
+            if page_token:
+                params['pageToken'] = page_token
+            if self.fields:
+                params['fields'] = self.fields
+            request = self.service.events().list(**params)
+            _enable_gzip(request)
+            with metrics.stage('google.events_list'):
+                result = request.execute(http=self.http) if self.http is not None else request.execute()
+            self.pages += 1
+            items = result.get('items', [])
+            metrics.incr('google.events_list.items', len(items))
+            yield from items
+            page_token = result.get('nextPageToken')
+            if not page_token:
+                self.next_sync_token = result.get('nextSyncToken')
+                return
+
+def list_events(service, http=None, fields=EVENT_LIST_FIELDS, **params):
+    """events.list のページを順に取得するイテレータを返す"""
+    return EventListing(service, http=http, fields=fields, **params)
@@ -0,0 +1,117 @@
+# calendar_watch.py
+# Google Calendar の events.watch（プッシュ通知）を登録し、予定が変わったら応答キャッシュを破棄する
+#
+# CALENDAR_WATCH_URL には、Bot の ローカルHTTPサーバー（WATCH_PATH）に転送される公開 HTTPS アドレスを指定する
+import os
+import uuid
+import time
+import asyncio
+import secrets
+import threading
+import local_http
+from calendar_service import TOKEN_PATH, get_service_account_credentials, get_calendar_service
+from event_store import get_event_store
+from response_cache import invalidate_all
+
+CALENDAR_WATCH_URL = os.getenv('CALENDAR_WATCH_URL')
+CALENDAR_WATCH_TOKEN = os.getenv('CALENDAR_WATCH_TOKEN') or secrets.token_hex(16)
+CALENDAR_WATCH_TTL = int(os.getenv('CALENDAR_WATCH_TTL', '86400'))
+WATCH_PATH = '/calendar/notify'
+
+# 期限のこの秒数前に登録し直す
+RENEW_MARGIN_SECONDS = 600
+RETRY_SECONDS = 300
+
+_lock = threading.Lock()
+# calendar_id → {'service', 'id', 'resource_id', 'expiration'}
+_channels = {}
+
+def _watch_targets():
+    """プッシュ通知を受け取るカレンダーの一覧 [(service, calendar_id)]"""
+    targets = []
+    credentials = get_service_account_credentials()
+    if credentials is not None:
+        service = get_calendar_service(credentials)
+        calendar_list = service.calendarList().list().execute()
+        for calendar in calendar_list.get('items', []):
+            if calendar.get('accessRole', 'Unknown') in ['reader', 'writer', 'owner']:
+                targets.append((service, calendar['id']))
+    # CalendarBot（OAuth）の primary カレンダーは、認証済みの場合のみ
+    if os.path.exists(TOKEN_PATH):
+        from calendar_integration import get_calendar_bot
+        calendar_bot = get_calendar_bot()
+        targets.append((calendar_bot.service, calendar_bot.CALENDAR_ID))
+    return targets
+
+def _stop_channel(channel):
+    try:
+        channel['service'].channels().stop(
+            body={'id': channel['id'], 'resourceId': channel['resource_id']}
+        ).execute()
+    except Exception as e:
+        print(f"⚠️ 通知チャンネル停止エラー: {e}")
+
+def start_watch(service, calendar_id):
+    """カレンダーの変更通知を登録する（古いチャンネルは新しいものを登録してから停止）"""
+    response = service.events().watch(calendarId=calendar_id, body={
+        'id': str(uuid.uuid4()),
+        'type': 'web_hook',
+        'address': CALENDAR_WATCH_URL,
+        'token': CALENDAR_WATCH_TOKEN,
+        'params': {'ttl': str(CALENDAR_WATCH_TTL)},
+    }).execute()
+    channel = {
+        'service': service,
+        'id': response['id'],
+        'resource_id': response['resourceId'],
+        'expiration': int(response.get('expiration', 0)) / 1000 or time.time() + CALENDAR_WATCH_TTL,
+    }
+    with _lock:
+        old_channel = _channels.get(calendar_id)
+        _channels[calendar_id] = channel
+    if old_channel:
+        _stop_channel(old_channel)
+    print(f"🔔 変更通知を登録しました: {calendar_id}")
+
+def renew_watches():
+    """未登録・期限が近いチャンネルを登録し直す 戻り値: 次に確認するまでの秒数"""
+    now = time.time()
+    next_check = CALENDAR_WATCH_TTL
+    for service, calendar_id in _watch_targets():
+        with _lock:
+            channel = _channels.get(calendar_id)
+        if channel is None or channel['expiration'] - RENEW_MARGIN_SECONDS <= now:
+            try:
+                start_watch(service, calendar_id)
+                with _lock:
+                    channel = _channels[calendar_id]
+            except Exception as e:
+                print(f"⚠️ 変更通知の登録エラー ({calendar_id}): {e}")
+                next_check = min(next_check, RETRY_SECONDS)
+                continue
+        next_check = min(next_check, channel['expiration'] - RENEW_MARGIN_SECONDS - now)
+    return max(next_check, 60)
+
+@local_http.route('POST', WATCH_PATH)
+def handle_notification(method, path, headers, body):
+    """Google からのプッシュ通知を受け取る"""
+    if headers.get('x-goog-channel-token') != CALENDAR_WATCH_TOKEN:
+        return 403, 'text/plain', 'forbidden'
+    state = headers.get('x-goog-resource-state')
+    # sync は登録直後の確認通知なので無視する
+    if state != 'sync':
+        invalidate_all(f"カレンダー更新通知: {state}")
+        # 他のシャードのワーカーはストアの変化を見て応答キャッシュを破棄する
+        get_event_store().mark_stale()
+    return 200, 'text/plain', ''
+
+async def run_watch_loop():
+    """変更通知の登録・更新を続けるバックグラウンドタスク"""
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            delay = await loop.run_in_executor(None, renew_watches)
+        except Exception as e:
+            print(f"⚠️ 変更通知の更新エラー: {e}")
+            delay = RETRY_SECONDS
+        await asyncio.sleep(delay)
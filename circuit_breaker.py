@@ -0,0 +1,73 @@
+# circuit_breaker.py
+# 外部APIが続けて失敗したら一定時間呼び出しを止めるサーキットブレーカー
+#
+#   closed    通常どおり呼び出す（failure_threshold 回続けて失敗したら open へ）
+#   open      呼び出さない（reset_seconds 経過したら half_open へ）
+#   half_open 1回だけ試しに呼び出し、成功なら closed、失敗なら open に戻す
+import time
+import threading
+import metrics
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class CircuitBreaker:
+    """連続した失敗を数えて、呼び出してよいかを判定する"""
+
+    def __init__(self, name, failure_threshold=3, reset_seconds=60):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state
+
+    def allow(self):
+        """呼び出してよいか（half_open では同時に1回だけ許可する）"""
+        with self._lock:
+            if self._state == OPEN:
+                if time.monotonic() - self._opened_at < self.reset_seconds:
+                    metrics.incr(f'breaker.{self.name}.rejected')
+                    return False
+                self._state = HALF_OPEN
+                self._trial_in_flight = False
+            if self._state == HALF_OPEN:
+                if self._trial_in_flight:
+                    metrics.incr(f'breaker.{self.name}.rejected')
+                    return False
+                self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self._state != CLOSED:
+                print(f"✅ {self.name}: 呼び出しを再開します")
+            self._state = CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+            metrics.set_gauge(f'breaker.{self.name}.open', 0)
+
+    def release(self):
+        """成功・失敗のどちらにも数えずに、half_open の試行の枠だけ返す（呼び出し先の障害ではない失敗など）"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    print(f"⛔ {self.name}: {self._failures}回続けて失敗したため {self.reset_seconds}秒間呼び出しを止めます")
+                    metrics.incr(f'breaker.{self.name}.opened')
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                metrics.set_gauge(f'breaker.{self.name}.open', 1)
@@ -0,0 +1,139 @@
+# client_profile.py
+# Discord クライアントのキャッシュ設定とメモリ使用量のレポート
+#
+# BOT_PROFILE=lean にすると、サーバー数が増えてもメモリが増えにくい設定でクライアントを作る
+#   - インテントは guilds / guild_messages / dm_messages（と MESSAGE_CONTENT_INTENT）のみ
+#   - メッセージキャッシュなし、起動時のメンバー取得（チャンキング）なし、メンバーキャッシュなし
+#   - 送信先のチャンネル・DM は最大 CHANNEL_CACHE_SIZE 件だけ保持する（古いものから捨てる）
+import os
+import time
+import asyncio
+from collections import OrderedDict
+import metrics
+
+BOT_PROFILE = os.getenv('BOT_PROFILE', 'default')
+CHANNEL_CACHE_SIZE = int(os.getenv('CHANNEL_CACHE_SIZE', '256'))
+MEMORY_REPORT_SECONDS = int(os.getenv('MEMORY_REPORT_SECONDS', '300'))
+
+def is_lean():
+    return BOT_PROFILE == 'lean'
+
+def build_intents(message_content):
+    """プロファイルに応じたインテント"""
+    import discord
+    if is_lean():
+        intents = discord.Intents.none()
+        # サーバー・チャンネルの情報（コマンドの権限確認に使う）とメッセージの受信だけ
+        intents.guilds = True
+        intents.guild_messages = True
+        intents.dm_messages = True
+    else:
+        intents = discord.Intents.default()
+    intents.message_content = message_content
+    return intents
+
+def client_options():
+    """プロファイルに応じた discord.Client のキャッシュ設定"""
+    import discord
+    if not is_lean():
+        return {}
+    return {
+        'max_messages': None,
+        'chunk_guilds_at_startup': False,
+        'member_cache_flags': discord.MemberCacheFlags.none(),
+    }
+
+class ChannelCache:
+    """送信先のチャンネル・ユーザーを最大 maxsize 件まで保持する（LRU）"""
+
+    def __init__(self, maxsize=CHANNEL_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+
+    def __len__(self):
+        return len(self._items)
+
+    def _get(self, key):
+        item = self._items.get(key)
+        if item is not None:
+            self._items.move_to_end(key)
+            metrics.incr('channel_cache.hit')
+        return item
+
+    def _put(self, key, item):
+        metrics.incr('channel_cache.miss')
+        self._items[key] = item
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+        return item
+
+    async def channel(self, client, channel_id):
+        """チャンネルを取得（クライアントのキャッシュになければ HTTP API で取得して保持する）"""
+        channel = client.get_channel(channel_id)
+        if channel is not None:
+            return channel
+        channel = self._get(('channel', channel_id))
+        if channel is None:
+            channel = self._put(('channel', channel_id), await client.fetch_channel(channel_id))
+        return channel
+
+    async def user(self, client, user_id):
+        """DMの送信先ユーザーを取得（メンバーキャッシュがなくても毎回 HTTP API で取得しない）"""
+        user = client.get_user(user_id)
+        if user is not None:
+            return user
+        user = self._get(('user', user_id))
+        if user is None:
+            user = self._put(('user', user_id), await client.fetch_user(user_id))
+        return user
+
+# Bot全体で共有する送信先キャッシュ
+channel_cache = ChannelCache()
+
+def resident_set_bytes():
+    """現在の常駐メモリ（RSS）のバイト数（/proc がなければ最大値で代用、どちらもなければ 0）"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        pass
+    try:
+        # resource は Unix のみ（Windows では読み込めない）
+        import resource
+    except ImportError:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def memory_report(client):
+    """メモリ使用量とキャッシュの件数"""
+    guilds = client.guilds
+    return {
+        'rss_bytes': resident_set_bytes(),
+        'guilds': len(guilds),
+        'channels': sum(len(guild.channels) for guild in guilds),
+        'members': sum(len(guild.members) for guild in guilds),
+        'users': len(client.users),
+        'messages': len(client.cached_messages),
+        'channel_cache': len(channel_cache),
+    }
+
+def update_memory_gauges(client):
+    """メモリ使用量をメトリクスのゲージに反映する"""
+    report = memory_report(client)
+    for name, value in report.items():
+        metrics.set_gauge(f'memory.{name}', value)
+    return report
+
+async def run_memory_report_loop(client):
+    """メモリ使用量を定期的にゲージに反映し、ログに出力する"""
+    print(f"🧠 クライアントプロファイル: {BOT_PROFILE}")
+    while True:
+        started = time.perf_counter()
+        report = update_memory_gauges(client)
+        metrics.observe('memory.report', time.perf_counter() - started)
+        print(
+            f"🧠 RSS {report['rss_bytes'] / 1024 / 1024:.1f}MB / サーバー {report['guilds']} / "
+            f"メンバー {report['members']} / メッセージ {report['messages']} / 送信先 {report['channel_cache']}"
+        )
+        await asyncio.sleep(MEMORY_REPORT_SECONDS)
@@ -0,0 +1,42 @@
+# command_registry.py
+# Botコマンドの登録と振り分け（コマンド名 → ハンドラの辞書で1回で引く）
+#
+# ハンドラは (ctx, args) を受け取り、返信するテキスト（返信しない場合は None）を返すコルーチン関数
+# プレフィックスコマンド（!明日 など）とスラッシュコマンドの両方から同じハンドラを呼ぶ
+import metrics
+
+COMMAND_PREFIX = '!'
+
+# コマンド名 → (ハンドラ, メトリクス名)
+_commands = {}
+
+class CommandContext:
+    """コマンドを実行したサーバー・チャンネル・ユーザーと、サーバーの地区キー"""
+
+    def __init__(self, guild, channel, author, district):
+        self.guild = guild
+        self.channel = channel
+        self.author = author
+        self.district = district
+
+def command(name, metric_name):
+    """ハンドラを登録するデコレータ"""
+    def decorator(handler):
+        _commands[name] = (handler, metric_name)
+        return handler
+    return decorator
+
+def parse(content):
+    """'!コマンド 引数 ...' を (コマンド名, 引数一覧) に分ける（コマンドでなければ None）"""
+    if not content.startswith(COMMAND_PREFIX):
+        return None
+    name, *args = content[len(COMMAND_PREFIX):].split() or ['']
+    if name not in _commands:
+        return None
+    return name, args
+
+async def dispatch(name, ctx, args):
+    """コマンドを実行して返信するテキストを返す"""
+    handler, metric_name = _commands[name]
+    metrics.incr(f'command.{metric_name}')
+    return await handler(ctx, args)
@@ -0,0 +1,71 @@
+# discord_rest.py
+# ゲートウェイ（WebSocket）に接続せず、Discord の HTTP API / Webhook でメッセージを送信する
+import os
+import json
+import asyncio
+import urllib.error
+import urllib.request
+
+# テスト時はローカルのスタブサーバーを指定できる
+DISCORD_API_BASE = os.getenv('DISCORD_API_BASE', 'https://discord.com/api/v10')
+REQUEST_TIMEOUT_SECONDS = float(os.getenv('DISCORD_REST_TIMEOUT', '10'))
+USER_AGENT = 'DiscordBot (https://github.com/syou-00/DiscordBot_Gomidasi, 1.0)'
+
+class DiscordRestError(Exception):
+    """Discord HTTP API のエラー（status=429 の場合は retry_after 秒後に再送できる）"""
+
+    def __init__(self, status, body, retry_after=None):
+        super().__init__(f"{status}: {body}")
+        self.status = status
+        self.body = body
+        self.retry_after = retry_after
+
+def _request_json(method, url, payload=None, headers=None):
+    """JSON のリクエストを送って応答を返す（エラーは DiscordRestError）"""
+    request_headers = {'User-Agent': USER_AGENT}
+    data = None
+    if payload is not None:
+        request_headers['Content-Type'] = 'application/json'
+        data = json.dumps(payload).encode('utf-8')
+    request_headers.update(headers or {})
+    request = urllib.request.Request(url, data=data, headers=request_headers, method=method)
+    try:
+        with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT_SECONDS) as response:
+            body = response.read()
+            return json.loads(body) if body else None
+    except urllib.error.HTTPError as e:
+        body = e.read().decode('utf-8', 'replace')
+        retry_after = None
+        if e.code == 429:
+            try:
+                retry_after = float(json.loads(body).get('retry_after'))
+            except (ValueError, TypeError, AttributeError):
+                retry_after = float(e.headers.get('Retry-After') or 1.0)
+        raise DiscordRestError(e.code, body, retry_after)
+
+def _post_json(url, payload, headers=None):
+    """JSON を POST して応答を返す（エラーは DiscordRestError）"""
+    return _request_json('POST', url, payload, headers)
+
+def get_gateway_bot(token, api_base=None):
+    """ゲートウェイの接続情報を取得（shards: Discord が推奨するシャード数）"""
+    url = f"{(api_base or DISCORD_API_BASE).rstrip('/')}/gateway/bot"
+    return _request_json('GET', url, headers={'Authorization': f'Bot {token}'})
+
+def post_channel_message(token, channel_id, content, api_base=None):
+    """Bot トークンでチャンネルにメッセージを送信"""
+    url = f"{(api_base or DISCORD_API_BASE).rstrip('/')}/channels/{channel_id}/messages"
+    return _post_json(url, {'content': content}, {'Authorization': f'Bot {token}'})
+
+def post_webhook_message(webhook_url, content):
+    """Webhook URL にメッセージを送信（wait=true で送信結果を受け取る）"""
+    separator = '&' if '?' in webhook_url else '?'
+    return _post_json(f"{webhook_url}{separator}wait=true", {'content': content})
+
+async def post_channel_message_async(token, channel_id, content, api_base=None):
+    """post_channel_message の非同期版"""
+    return await asyncio.to_thread(post_channel_message, token, channel_id, content, api_base)
+
+async def post_webhook_message_async(webhook_url, content):
+    """post_webhook_message の非同期版"""
+    return await asyncio.to_thread(post_webhook_message, webhook_url, content)
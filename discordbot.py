@@ -1,43 +1,257 @@
 import discord
 import config
 import random
-from calendar_integration import get_calendar_bot
-from google_calendar import get_tomorrow_events
+import os
+import datetime
+import metrics
+import asyncio
+import local_http
+import calendar_watch
+import calendar_service
+import notification_scheduler
+import reminders
+import command_registry
+import client_profile
+from typing import Optional
+from discord import app_commands
+from calendar_async import (
+    get_calendar_bot_async, get_events_between_async, get_next_event_async, get_tomorrow_events_async
+)
+from calendar_integration import EVENT_TYPES
+from command_registry import CommandContext
+from event_classifier import classify
+from guild_config import DEFAULT_DISTRICT, get_guild_store
+from outbound_queue import send_message
+from schedule_rules import WEEKDAY_NAMES, get_regions
 
-# 必要最低限のインテントのみを設定
-intents = discord.Intents.default()
-intents.message_content = True  # メッセージ内容を読み取るために必要
-client = discord.Client(intents=intents)
+JST = datetime.timezone(datetime.timedelta(hours=9))
 
+# メトリクス・カレンダー変更通知を受け付けるローカルHTTPサーバー（ポート未設定なら起動しない）
+LOCAL_HTTP_PORT = int(os.getenv('LOCAL_HTTP_PORT') or os.getenv('METRICS_PORT') or 0)
+LOCAL_HTTP_HOST = os.getenv('LOCAL_HTTP_HOST') or os.getenv('METRICS_HOST', '127.0.0.1')
 
+# シャード設定（shard_launcher.py が起動するワーカープロセスでは SHARD_IDS / SHARD_COUNT が設定される）
+# SHARD_COUNT=auto で Discord の推奨シャード数を1プロセスで使う
+SHARD_COUNT = os.getenv('SHARD_COUNT')
+SHARD_IDS = [int(shard_id) for shard_id in os.getenv('SHARD_IDS', '').split(',') if shard_id.strip()] or None
+
+# メッセージ本文を読むインテント（特権インテント）を使うか
+MESSAGE_CONTENT_INTENT = os.getenv('MESSAGE_CONTENT_INTENT', '1') == '1'
+# 起動時にスラッシュコマンドを Discord に登録するか
+SYNC_SLASH_COMMANDS = os.getenv('SYNC_SLASH_COMMANDS', '1') == '1'
+
+# バックグラウンドタスク（on_ready は再接続のたびに呼ばれるので1回だけ起動する）
+background_tasks = {}
+# 起動通知は再接続やシャードの数によらず1回だけ送る
+startup_notified = False
+# リマインダーのスケジューラ（シャード0を担当するプロセスでのみ動かす）
+reminder_scheduler = None
+
+@local_http.route('GET', '/metrics')
+def metrics_prometheus(method, path, headers, body):
+    client_profile.update_memory_gauges(client)
+    return 200, 'text/plain; version=0.0.4', metrics.render_prometheus()
+
+@local_http.route('GET', '/metrics.json')
+def metrics_json(method, path, headers, body):
+    client_profile.update_memory_gauges(client)
+    return 200, 'application/json', metrics.render_json()
+
+def create_client(intents):
+    """シャード設定があれば AutoShardedClient、なければ通常の Client を作成（キャッシュ設定は BOT_PROFILE による）"""
+    options = client_profile.client_options()
+    if SHARD_COUNT or SHARD_IDS:
+        shard_count = int(SHARD_COUNT) if SHARD_COUNT and SHARD_COUNT != 'auto' else None
+        return discord.AutoShardedClient(intents=intents, shard_count=shard_count, shard_ids=SHARD_IDS, **options)
+    return discord.Client(intents=intents, **options)
+
+def is_primary_process():
+    """シャード0を担当するプロセスか（定時通知・起動通知・変更通知の登録はこのプロセスだけが行う）"""
+    shard_ids = getattr(client, 'shard_ids', None)
+    return not shard_ids or 0 in shard_ids
+
+# 必要最低限のインテントのみを設定（BOT_PROFILE=lean でさらに絞る）
+# スラッシュコマンドだけで使う場合は MESSAGE_CONTENT_INTENT=0 にできる（メンション・DMのコマンドは引き続き使える）
+intents = client_profile.build_intents(MESSAGE_CONTENT_INTENT)
+client = create_client(intents)
+tree = app_commands.CommandTree(client)
+
+@client.event
+async def on_shard_ready(shard_id):
+    print(f"Shard {shard_id} ready")
+    metrics.incr('discord.shard_ready')
 
 @client.event
 async def on_ready():
+    global startup_notified, reminder_scheduler
     print("Ready!")
+    if getattr(client, 'shard_ids', None):
+        print(f"担当シャード: {client.shard_ids} / {client.shard_count}")
+    
+    # アクセストークンは期限前にバックグラウンドで更新する
+    calendar_service.start_background_refresh()
+    
+    # メトリクスはプロセスごと（ワーカーごとに別のポートを使う）
+    if LOCAL_HTTP_PORT:
+        await local_http.start(LOCAL_HTTP_HOST, LOCAL_HTTP_PORT)
+    if 'memory_report' not in background_tasks:
+        background_tasks['memory_report'] = asyncio.create_task(client_profile.run_memory_report_loop(client))
+    
+    # 以降はシャード0を担当するプロセスで1回だけ行う
+    if not is_primary_process() or startup_notified:
+        return
+    startup_notified = True
+    
+    # スラッシュコマンドを登録する（グローバルコマンドなので1回だけ）
+    if SYNC_SLASH_COMMANDS:
+        try:
+            synced = await tree.sync()
+            print(f"⌨️ スラッシュコマンドを登録しました: {len(synced)}件")
+        except discord.HTTPException as e:
+            print(f"スラッシュコマンドの登録に失敗しました: {e}")
+    
+    # 毎日の予定通知をこのプロセス内で送る
+    if notification_scheduler.IN_PROCESS_NOTIFY and 'notification_scheduler' not in background_tasks:
+        scheduler = notification_scheduler.NotificationScheduler(client)
+        background_tasks['notification_scheduler'] = asyncio.create_task(scheduler.run())
+    
+    # ユーザーごとのリマインダーを送る
+    reminder_scheduler = reminders.ReminderScheduler(client)
+    background_tasks['reminders'] = asyncio.create_task(reminder_scheduler.run())
+    
+    # カレンダーの変更通知でコマンドの応答キャッシュを破棄する
+    if LOCAL_HTTP_PORT and calendar_watch.CALENDAR_WATCH_URL and 'calendar_watch' not in background_tasks:
+        background_tasks['calendar_watch'] = asyncio.create_task(calendar_watch.run_watch_loop())
+    
+    if not (hasattr(config, 'NOTIFY_CHANNEL_ID') and config.NOTIFY_CHANNEL_ID):
+        return
+    channel = await get_notify_channel()
+    if not channel:
+        return
+    
+    # 翌日の予定と起動通知は送信キューで1件のメッセージにまとめて送る
+    sends = []
     
     # 翌日の予定をチェックして通知
     try:
-        tomorrow_events = get_tomorrow_events()
+        tomorrow_events = await get_tomorrow_events_async()
         
-        if tomorrow_events and hasattr(config, 'NOTIFY_CHANNEL_ID') and config.NOTIFY_CHANNEL_ID:
-            channel = client.get_channel(config.NOTIFY_CHANNEL_ID)
-            if channel:
-                # 翌日の予定をまとめて送信
-                messages = []
-                for event in tomorrow_events:
-                    messages.append(f"明日は{event['summary']}の予定があります")
+        if tomorrow_events:
+            # 翌日の予定をまとめて送信
+            messages = []
+            for event in tomorrow_events:
+                messages.append(f"明日は{event['summary']}の予定があります")
+            
+            if messages:
+                sends.append(send_message(channel, "**明日の予定**\n" + "\n".join(messages)))
                 
-                if messages:
-                    await channel.send("**明日の予定**\n" + "\n".join(messages))
-                    
     except Exception as e:
         print(f"翌日の予定チェック中にエラーが発生しました: {str(e)}")
     
     # Botが起動したことを通知するメッセージを送信
-    if hasattr(config, 'NOTIFY_CHANNEL_ID') and config.NOTIFY_CHANNEL_ID:
-        channel = client.get_channel(config.NOTIFY_CHANNEL_ID)
-        if channel:
-            await channel.send("Botが起動しました！")
+    sends.append(send_message(channel, "Botが起動しました！"))
+    await asyncio.gather(*sends)
+
+async def get_notify_channel():
+    """通知チャンネルを取得（別のシャードのサーバーのチャンネルは HTTP API で取得する）"""
+    try:
+        return await client_profile.channel_cache.channel(client, config.NOTIFY_CHANNEL_ID)
+    except discord.HTTPException as e:
+        print(f"通知チャンネルの取得に失敗しました: {e}")
+        return None
+
+def get_district(guild):
+    """サーバーの地区キー（同じ地区のサーバーは取得結果を共有する）"""
+    return get_guild_store().get_district(guild.id) if guild else DEFAULT_DISTRICT
+
+def format_tomorrow(tomorrow_events):
+    if not tomorrow_events:
+        return "明日の予定はありません。"
+    responses = []
+    for event in tomorrow_events:
+        responses.append(f"明日は{event['summary']}の予定があります")
+    return "**明日の予定**\n" + "\n".join(responses)
+
+@command_registry.command('カレンダー', 'calendar')
+async def command_calendar(ctx, args):
+    calendar_bot = await get_calendar_bot_async()
+    if len(args) > 1:
+        return "使用方法: !カレンダー [家庭/プラスチック/紙]"
+    # 種類の指定がなければ直近のイベント
+    event = await get_next_event_async(*args)
+    return calendar_bot.format_event_message(event)
+
+@command_registry.command('明日', 'tomorrow')
+async def command_tomorrow(ctx, args):
+    return format_tomorrow(await get_tomorrow_events_async(ctx.district))
+
+@command_registry.command('週間', 'week')
+async def command_week(ctx, args):
+    """1週間分の予定をまとめて表示"""
+    start_date = datetime.datetime.now(JST).date() + datetime.timedelta(days=1)
+    end_date = start_date + datetime.timedelta(days=6)
+    days = await get_events_between_async(start_date, end_date, ctx.district)
+    
+    lines = []
+    for date, events in days.items():
+        summaries = '、'.join(event['summary'] for event in events) if events else '予定なし'
+        lines.append(f"{date.strftime('%m/%d')}({WEEKDAY_NAMES[date.weekday()]}) {summaries}")
+    return "**1週間の予定**\n" + "\n".join(lines)
+
+@command_registry.command('地区設定', 'guild_config')
+async def command_guild_config(ctx, args):
+    """サーバーの通知チャンネル・地区・カレンダーを設定（サーバー管理権限が必要）"""
+    if not ctx.guild or not ctx.author.guild_permissions.manage_guild:
+        return "このコマンドはサーバー管理権限のあるメンバーのみ使用できます"
+    if not args or args[0] not in get_regions():
+        return f"使用方法: !地区設定 地区名 [カレンダーID ...]\n地区: {'、'.join(get_regions())}"
+    guild_config = get_guild_store().set(
+        ctx.guild.id, channel_id=ctx.channel.id, region=args[0], calendar_ids=args[1:]
+    )
+    calendars = '、'.join(guild_config['calendar_ids']) if guild_config['calendar_ids'] else '既定'
+    return f"✅ このチャンネルに通知します\n地区: {guild_config['region']}\nカレンダー: {calendars}"
+
+@command_registry.command('リマインド解除', 'reminder_unsubscribe')
+async def command_unremind(ctx, args):
+    if reminders.get_reminder_store().unsubscribe(ctx.author.id):
+        response = "🔕 リマインダーを解除しました"
+    else:
+        response = "リマインダーは登録されていません"
+    if reminder_scheduler is not None:
+        reminder_scheduler.notify_changed()
+    return response
+
+@command_registry.command('リマインド', 'reminder')
+async def command_remind(ctx, args):
+    """リマインダーの登録・確認（例: !リマインド 紙 プラスチック 20:00）"""
+    parts = list(args)
+    remind_time = reminders.REMINDER_DEFAULT_TIME
+    if parts and ':' in parts[-1]:
+        try:
+            remind_time = reminders.parse_remind_time(parts.pop())
+        except ValueError:
+            return "時刻は 20:00 のように指定してください"
+    
+    if not parts:
+        subscription = reminders.get_reminder_store().get(ctx.author.id)
+        if subscription:
+            return f"🔔 {'、'.join(subscription['categories'])} の前日 {subscription['remind_time']} にDMでお知らせします"
+        return f"使用方法: !リマインド [{'/'.join(EVENT_TYPES)}] ... [時刻]\n解除: !リマインド解除"
+    
+    unknown = [category for category in parts if category not in EVENT_TYPES and classify(category) is None]
+    if unknown:
+        return f"種類が分かりません: {'、'.join(unknown)}"
+    reminders.get_reminder_store().subscribe(ctx.author.id, parts, remind_time, ctx.district)
+    if reminder_scheduler is not None:
+        reminder_scheduler.notify_changed()
+    return f"🔔 {'、'.join(parts)} の前日 {remind_time} にDMでお知らせします"
+
+async def run_command(name, ctx, args):
+    """コマンドを実行して返信するテキストを返す（例外はエラーメッセージにする）"""
+    try:
+        return await command_registry.dispatch(name, ctx, args)
+    except Exception as e:
+        return f"エラーが発生しました: {str(e)}"
 
 @client.event
 async def on_message(message):
@@ -45,58 +259,83 @@ async def on_message(message):
     if message.author == client.user:
         return
 
-    # カレンダー関連のコマンドを処理
-    if message.content.startswith('!カレンダー'):
-        try:
-            calendar_bot = get_calendar_bot()
-            parts = message.content.split()
-            
-            if len(parts) == 1:
-                # 直近のイベントを取得
-                event = calendar_bot.get_next_event()
-                response = calendar_bot.format_event_message(event)
-            elif len(parts) == 2:
-                # 特定のタイプのイベントを取得
-                event_type = parts[1]
-                event = calendar_bot.get_event_by_type(event_type)
-                response = calendar_bot.format_event_message(event)
-            else:
-                response = "使用方法: !カレンダー [家庭/プラスチック/紙]"
-            
-            # 予定がある場合のみメッセージを送信
-            if response:
-                await message.channel.send(response)
-            
-        except Exception as e:
-            await message.channel.send(f"エラーが発生しました: {str(e)}")
-    
-    # 明日の予定をチェック
-    elif message.content.startswith('!明日'):
-        try:
-            tomorrow_events = get_tomorrow_events()
-            
-            if tomorrow_events:
-                responses = []
-                for event in tomorrow_events:
-                    responses.append(f"明日は{event['summary']}の予定があります")
-                response = "**明日の予定**\n" + "\n".join(responses)
-            else:
-                response = "明日の予定はありません。"
-                
-            await message.channel.send(response)
-            
-        except Exception as e:
-            await message.channel.send(f"エラーが発生しました: {str(e)}")
+    # message_content インテントがなくても、メンションされたメッセージとDMの本文は届く（例: @Bot !明日）
+    content = message.content
+    if client.user in message.mentions:
+        content = content.replace(f'<@{client.user.id}>', '').replace(f'<@!{client.user.id}>', '').strip()
+
+    parsed = command_registry.parse(content)
+    if parsed is not None:
+        name, args = parsed
+        ctx = CommandContext(message.guild, message.channel, message.author, get_district(message.guild))
+        response = await run_command(name, ctx, args)
+        # 予定がある場合のみメッセージを送信
+        if response:
+            await send_message(message.channel, response)
 
     # ユーザーからのメンションを受け取った場合、あらかじめ用意された配列からランダムに返信を返す
     elif client.user in message.mentions:
         answer_list = ["さすがですね！","知らなかったです！","すごいですね！","センスが違いますね！","そうなんですか？"]
         answer = random.choice(answer_list)
         print(answer)
-        await message.channel.send(answer)
+        await send_message(message.channel, answer)
+
+# スラッシュコマンド（プレフィックスコマンドと同じハンドラを呼ぶ）
+async def run_slash_command(interaction, name, args, ephemeral=False):
+    # 応答は3秒以内に返す必要があるので、先に「考え中」を返してから結果を送る
+    await interaction.response.defer(ephemeral=ephemeral, thinking=True)
+    ctx = CommandContext(interaction.guild, interaction.channel, interaction.user, get_district(interaction.guild))
+    response = await run_command(name, ctx, args)
+    await interaction.followup.send(response or "該当する予定はありません", ephemeral=ephemeral)
+
+EVENT_TYPE_CHOICES = [app_commands.Choice(name=event_type, value=event_type) for event_type in EVENT_TYPES]
+
+@tree.command(name='カレンダー', description='次の収集日を表示します')
+@app_commands.rename(event_type='種類')
+@app_commands.describe(event_type='ごみの種類（省略すると直近の予定）')
+@app_commands.choices(event_type=EVENT_TYPE_CHOICES)
+async def slash_calendar(interaction: discord.Interaction, event_type: Optional[app_commands.Choice[str]] = None):
+    await run_slash_command(interaction, 'カレンダー', [event_type.value] if event_type else [])
+
+@tree.command(name='明日', description='明日の予定を表示します')
+async def slash_tomorrow(interaction: discord.Interaction):
+    await run_slash_command(interaction, '明日', [])
 
+@tree.command(name='週間', description='1週間分の予定を表示します')
+async def slash_week(interaction: discord.Interaction):
+    await run_slash_command(interaction, '週間', [])
 
+@tree.command(name='地区設定', description='このチャンネルに通知する地区とカレンダーを設定します')
+@app_commands.rename(region='地区', calendar_ids='カレンダーid')
+@app_commands.describe(region='地区', calendar_ids='カレンダーID（スペース区切り、省略すると既定のカレンダー）')
+@app_commands.choices(region=[app_commands.Choice(name=region, value=region) for region in get_regions()[:25]])
+@app_commands.default_permissions(manage_guild=True)
+@app_commands.guild_only()
+async def slash_guild_config(interaction: discord.Interaction, region: app_commands.Choice[str], calendar_ids: str = ''):
+    await run_slash_command(interaction, '地区設定', [region.value] + calendar_ids.split())
 
+# !リマインド 紙 プラスチック 20:00 と同じく複数の種類を登録できるように、種類の選択肢を複数受け付ける
+@tree.command(name='リマインド', description='指定した種類のごみの前日にDMでお知らせします')
+@app_commands.rename(event_type='種類', event_type2='種類2', event_type3='種類3', remind_time='時刻')
+@app_commands.describe(
+    event_type='ごみの種類（省略すると登録内容を表示）', event_type2='ごみの種類', event_type3='ごみの種類',
+    remind_time='お知らせする時刻（例: 20:00）'
+)
+@app_commands.choices(event_type=EVENT_TYPE_CHOICES, event_type2=EVENT_TYPE_CHOICES, event_type3=EVENT_TYPE_CHOICES)
+async def slash_remind(interaction: discord.Interaction,
+                       event_type: Optional[app_commands.Choice[str]] = None,
+                       event_type2: Optional[app_commands.Choice[str]] = None,
+                       event_type3: Optional[app_commands.Choice[str]] = None,
+                       remind_time: Optional[str] = None):
+    choices = (event_type, event_type2, event_type3)
+    args = list(dict.fromkeys(choice.value for choice in choices if choice))
+    if remind_time:
+        args.append(remind_time)
+    await run_slash_command(interaction, 'リマインド', args, ephemeral=True)
 
+@tree.command(name='リマインド解除', description='リマインダーを解除します')
+async def slash_unremind(interaction: discord.Interaction):
+    await run_slash_command(interaction, 'リマインド解除', [], ephemeral=True)
 
-client.run(config.DISCORD_TOKEN)
+if __name__ == '__main__':
+    client.run(config.DISCORD_TOKEN)
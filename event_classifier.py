@@ -0,0 +1,60 @@
+# event_classifier.py
+# 予定の件名をごみの種類（カテゴリ）に分類する
+import re
+import unicodedata
+from functools import lru_cache
+
+# カテゴリ → キーワード（表記ゆれは正規化で吸収するので代表的な表記のみ）
+CATEGORY_KEYWORDS = {
+    'burnable': ['燃えるごみ', '燃える', '可燃', '家庭ごみ', '生ごみ'],
+    'non_burnable': ['燃えない', '不燃'],
+    'plastic': ['プラスチック', 'プラ'],
+    'paper': ['紙', '古紙', '段ボール', 'ダンボール', '新聞', '雑誌'],
+    'bottles_cans': ['瓶', 'びん', '缶', 'ペット'],
+    'oversized': ['粗大'],
+    'hazardous': ['有害', '危険'],
+}
+
+# 種類が特定できない「ごみ」全般
+GENERIC_CATEGORY = 'garbage'
+GENERIC_KEYWORDS = ['ごみ', '資源']
+
+def normalize(text):
+    """全角半角・大文字小文字・カタカナ/ひらがなの違いをなくす"""
+    text = unicodedata.normalize('NFKC', text).lower()
+    # カタカナ → ひらがな
+    return ''.join(chr(ord(c) - 0x60) if 'ァ' <= c <= 'ヶ' else c for c in text)
+
+def _compile():
+    keyword_to_category = {}
+    for category, keywords in CATEGORY_KEYWORDS.items():
+        for keyword in keywords:
+            keyword_to_category[normalize(keyword)] = category
+    for keyword in GENERIC_KEYWORDS:
+        keyword_to_category.setdefault(normalize(keyword), GENERIC_CATEGORY)
+    # 同じ位置では長いキーワードを優先する
+    pattern = re.compile('|'.join(
+        re.escape(keyword) for keyword in sorted(keyword_to_category, key=len, reverse=True)
+    ))
+    return pattern, keyword_to_category
+
+_PATTERN, _KEYWORD_TO_CATEGORY = _compile()
+
+@lru_cache(maxsize=1024)
+def classify(summary):
+    """件名のカテゴリを返す（ごみ関連でなければ None）"""
+    generic = None
+    for match in _PATTERN.finditer(normalize(summary or '')):
+        category = _KEYWORD_TO_CATEGORY[match.group(0)]
+        if category != GENERIC_CATEGORY:
+            return category
+        generic = category
+    return generic
+
+def dedup_key(event):
+    """重複判定のキー（カテゴリ、分類できない場合は正規化した件名）"""
+    summary = event.get('summary', '')
+    category = classify(summary)
+    if category is not None:
+        return category
+    return 'summary:' + normalize(summary).strip()
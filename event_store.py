@@ -0,0 +1,251 @@
+# event_store.py
+# Google Calendar の予定をローカルのSQLiteに保持し、syncToken で差分だけを同期する
+import os
+import json
+import time
+import sqlite3
+import datetime
+import threading
+import metrics
+from calendar_service import list_events
+
+EVENT_STORE_PATH = os.getenv('EVENT_STORE_PATH', 'events.db')
+
+# 初回の全件同期で取得する過去分（これより前の予定は持たない）
+INITIAL_SYNC_LOOKBACK_DAYS = 1
+
+JST = datetime.timezone(datetime.timedelta(hours=9))
+# CalendarBot（OAuth のユーザー）が同期する primary カレンダー（ごみの日のカレンダーとは別に保存される）
+USER_CALENDAR_ID = 'primary'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    calendar_id TEXT NOT NULL,
+    event_id TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    start_date TEXT NOT NULL,
+    start_utc TEXT NOT NULL,
+    event_json TEXT NOT NULL,
+    end_utc TEXT,
+    PRIMARY KEY (calendar_id, event_id)
+);
+CREATE INDEX IF NOT EXISTS idx_events_start_date ON events (start_date);
+CREATE INDEX IF NOT EXISTS idx_events_start_utc ON events (start_utc);
+CREATE TABLE IF NOT EXISTS sync_state (
+    calendar_id TEXT PRIMARY KEY,
+    calendar_name TEXT,
+    sync_token TEXT,
+    synced_at REAL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value REAL
+);
+"""
+
+def _parse_event_time(value):
+    """予定の start / end を時刻に変換する（終日の予定はJSTの0時）"""
+    if 'dateTime' in value:
+        return datetime.datetime.fromisoformat(value['dateTime'].replace('Z', '+00:00'))
+    if 'date' in value:
+        value_date = datetime.datetime.strptime(value['date'], '%Y-%m-%d').date()
+        return datetime.datetime.combine(value_date, datetime.time.min).replace(tzinfo=JST)
+    return None
+
+def _utc_iso(value):
+    return value.astimezone(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def event_start_keys(start):
+    """予定の start から (JSTの日付, UTCの開始時刻) を求める（どちらもISO文字列）"""
+    start_datetime = _parse_event_time(start)
+    if start_datetime is None:
+        return None
+    return start_datetime.astimezone(JST).date().isoformat(), _utc_iso(start_datetime)
+
+def event_end_utc(event):
+    """予定の終了時刻（UTCのISO文字列）。終日の予定の end は翌日の0時（その日を含まない）
+    end がなければ終日の予定は開始日の翌日0時、時刻指定の予定は開始時刻とする"""
+    start = event.get('start', {})
+    end_datetime = _parse_event_time(event.get('end', {}))
+    if end_datetime is None:
+        end_datetime = _parse_event_time(start)
+        if end_datetime is None:
+            return None
+        if 'dateTime' not in start:
+            end_datetime += datetime.timedelta(days=1)
+    return _utc_iso(end_datetime)
+
+def fetch_changes(service, calendar_id, sync_token=None, http=None):
+    """
+    カレンダーの変更分を取得する
+    sync_token がない、または失効（410）している場合は全件同期を行う
+    戻り値: (items, next_sync_token, full_sync)
+    """
+    from googleapiclient.errors import HttpError
+
+    full_sync = sync_token is None
+    while True:
+        params = {'calendarId': calendar_id, 'singleEvents': True}
+        if full_sync:
+            time_min = datetime.datetime.now(JST) - datetime.timedelta(days=INITIAL_SYNC_LOOKBACK_DAYS)
+            params['timeMin'] = time_min.isoformat()
+        else:
+            params['syncToken'] = sync_token
+
+        listing = list_events(service, http=http, **params)
+        try:
+            items = list(listing)
+            return items, listing.next_sync_token, full_sync
+        except HttpError as e:
+            if not full_sync and getattr(e, 'resp', None) is not None and e.resp.status == 410:
+                print(f"🔄 syncToken 失効のため全件同期します: {calendar_id}")
+                full_sync = True
+                continue
+            raise
+
+class EventStore:
+    """カレンダーごとの予定と同期状態を保持するローカルストア"""
+
+    def __init__(self, path=None):
+        self.path = path or EVENT_STORE_PATH
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.executescript(_SCHEMA)
+            self._migrate()
+
+    def _migrate(self):
+        """終了時刻の列がない古いストアに列を追加し、次の同期で全件取得し直す"""
+        columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(events)")}
+        if 'end_utc' not in columns:
+            self._conn.execute("ALTER TABLE events ADD COLUMN end_utc TEXT")
+            self._conn.execute("UPDATE sync_state SET sync_token = NULL")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_events_end_utc ON events (end_utc)")
+
+    def get_sync_token(self, calendar_id):
+        """保存済みの syncToken を取得"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sync_token FROM sync_state WHERE calendar_id = ?", (calendar_id,)
+            ).fetchone()
+        return row['sync_token'] if row else None
+
+    def get_synced_at(self, calendar_id):
+        """最後に同期した時刻（UNIX時間）を取得"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT synced_at FROM sync_state WHERE calendar_id = ?", (calendar_id,)
+            ).fetchone()
+        return row['synced_at'] if row else None
+
+    def synced_calendars(self):
+        """同期済みのカレンダーと最終同期時刻 {calendar_id: synced_at}"""
+        with self._lock:
+            rows = self._conn.execute("SELECT calendar_id, synced_at FROM sync_state").fetchall()
+        return {row['calendar_id']: row['synced_at'] or 0 for row in rows}
+
+    def mark_stale(self):
+        """
+        すべてのカレンダーを未同期扱いにする（次の取得で同期し直す）
+        他のプロセスには invalidated_at の変化で伝わる（通常の同期では変わらない）
+        """
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE sync_state SET synced_at = 0")
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('invalidated_at', ?)", (time.time(),))
+
+    def invalidated_at(self):
+        """最後に mark_stale した時刻（UNIX時間、一度もなければ 0）"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'invalidated_at'").fetchone()
+        return row['value'] if row else 0.0
+
+    def apply_changes(self, calendar_id, calendar_name, items, next_sync_token, full_sync=False):
+        """取得した変更分を反映する（全件同期の場合は既存の予定を置き換える）"""
+        with self._lock, self._conn:
+            if full_sync:
+                self._conn.execute("DELETE FROM events WHERE calendar_id = ?", (calendar_id,))
+            for event in items:
+                if event.get('status') == 'cancelled':
+                    self._conn.execute(
+                        "DELETE FROM events WHERE calendar_id = ? AND event_id = ?",
+                        (calendar_id, event['id'])
+                    )
+                    continue
+                keys = event_start_keys(event.get('start', {}))
+                if keys is None:
+                    continue
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO events "
+                    "(calendar_id, event_id, summary, start_date, start_utc, event_json, end_utc) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (calendar_id, event['id'], event.get('summary', '名前なし'),
+                     keys[0], keys[1], json.dumps(event, ensure_ascii=False), event_end_utc(event))
+                )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?, ?)",
+                (calendar_id, calendar_name, next_sync_token, time.time())
+            )
+
+    def events_between(self, start_date, end_date, calendar_ids=None):
+        """JSTの日付範囲（両端を含む）の予定を開始時刻順に取得"""
+        query = (
+            "SELECT e.*, s.calendar_name FROM events e "
+            "LEFT JOIN sync_state s ON s.calendar_id = e.calendar_id "
+            "WHERE e.start_date BETWEEN ? AND ?"
+        )
+        params = [start_date.isoformat(), end_date.isoformat()]
+        if calendar_ids is not None:
+            calendar_ids = list(calendar_ids)
+            if not calendar_ids:
+                return []
+            query += " AND e.calendar_id IN (%s)" % ','.join('?' * len(calendar_ids))
+            params.extend(calendar_ids)
+        query += " ORDER BY e.start_utc"
+        with self._lock, metrics.stage('store.query'):
+            rows = self._conn.execute(query, params).fetchall()
+        return [self._row_to_event(row) for row in rows]
+
+    def next_event(self, calendar_id, after=None, query=None):
+        """指定時刻にまだ終わっていない最初の予定を取得（開催中・今日の終日の予定も含む。query は件名の部分一致）"""
+        after = after or datetime.datetime.now(datetime.timezone.utc)
+        sql = "SELECT event_json FROM events WHERE calendar_id = ? AND end_utc > ?"
+        params = [calendar_id, _utc_iso(after)]
+        if query:
+            sql += " AND summary LIKE ?"
+            params.append(f"%{query}%")
+        sql += " ORDER BY start_utc LIMIT 1"
+        with self._lock:
+            row = self._conn.execute(sql, params).fetchone()
+        return json.loads(row['event_json']) if row else None
+
+    @staticmethod
+    def _row_to_event(row):
+        event = json.loads(row['event_json'])
+        event['calendar'] = row['calendar_name'] or row['calendar_id']
+        event['start_date'] = row['start_date']
+        return event
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def sync_calendar(store, service, calendar_id, calendar_name=None, http=None):
+    """1つのカレンダーを差分同期する"""
+    items, next_sync_token, full_sync = fetch_changes(
+        service, calendar_id, store.get_sync_token(calendar_id), http=http
+    )
+    store.apply_changes(calendar_id, calendar_name or calendar_id, items, next_sync_token, full_sync)
+    return len(items)
+
+# グローバルインスタンス
+event_store = None
+_store_lock = threading.Lock()
+
+def get_event_store():
+    """EventStoreのシングルトンインスタンスを取得"""
+    global event_store
+    with _store_lock:
+        if event_store is None:
+            event_store = EventStore()
+        return event_store
@@ -1,237 +1,420 @@
 # google_calendar.py (ハイブリッド版)
 import os
-import json
 import datetime
-import pytz
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+import metrics
+from calendar_service import (
+    GOOGLE_HTTP_TIMEOUT, GOOGLE_STATUS_LABELS, get_calendar_service, get_service_account_credentials,
+    get_thread_http, google_breaker, google_status, set_google_status
+)
+from event_store import EVENT_STORE_PATH, JST, USER_CALENDAR_ID, fetch_changes, get_event_store
+from event_classifier import dedup_key
+from ics_source import get_ics_events_between
+from schedule_rules import WEEKDAY_NAMES, get_schedule, get_week_of_month
 
-# サービスアカウント用の認証
-SCOPES = ["https://www.googleapis.com/auth/calendar.readonly"]
+# カレンダー並列取得の設定（同時実行数・カレンダーごとのタイムアウト秒数）
+MAX_CONCURRENT_CALENDARS = int(os.getenv('GOOGLE_CALENDAR_MAX_WORKERS', '8'))
+CALENDAR_TIMEOUT_SECONDS = GOOGLE_HTTP_TIMEOUT
 
-def get_google_calendar_events():
-    """Google Calendarから明日の予定を取得"""
+# ローカルストアの同期がこの秒数以内なら Google API を呼ばずにストアから答える（0 で無効）
+GOOGLE_CACHE_MAX_AGE = float(os.getenv('GOOGLE_CACHE_MAX_AGE', '0'))
+
+# Google Calendar の同期を待つ上限秒数（超えたら保存済みの予定で答え、同期はバックグラウンドで続ける）
+GOOGLE_DEADLINE_SECONDS = float(os.getenv('GOOGLE_DEADLINE_SECONDS', '5'))
+
+_STATUS_PRIORITY = ['ok', 'timeout', 'error', 'circuit_open']
+
+_sync_lock = threading.Lock()
+# 実行中の同期（同じ範囲の同期は1回にまとめる）
+_inflight_syncs = {}
+_sync_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='google-sync')
+# カレンダーごとの取得に使うスレッド（スレッドごとの接続を同期をまたいで使い回すため、同期ごとには作らない）
+_calendar_executor = ThreadPoolExecutor(max_workers=max(1, MAX_CONCURRENT_CALENDARS), thread_name_prefix='google-calendar')
+
+def _worst_status(statuses):
+    return max(statuses, key=_STATUS_PRIORITY.index, default='ok')
+
+def _fetch_calendar_changes(service, credentials, calendar, sync_token):
+    """1つのカレンダーの変更分を取得（ワーカースレッドで実行）"""
+    from googleapiclient.errors import HttpError
+    
+    calendar_name = calendar.get('summary', 'Unknown')
     try:
-        print("🔐 Google Calendar認証中...")
-        
-        service_account_key = os.getenv('GOOGLE_SERVICE_ACCOUNT_KEY')
-        if not service_account_key:
-            print("⚠️ GOOGLE_SERVICE_ACCOUNT_KEY が設定されていません")
-            return []
-        
-        service_account_info = json.loads(service_account_key)
-        print(f"✅ サービスアカウント: {service_account_info.get('client_email', 'Unknown')}")
-        
-        credentials = service_account.Credentials.from_service_account_info(
-            service_account_info, scopes=SCOPES
-        )
-        
-        service = build("calendar", "v3", credentials=credentials)
-        print("✅ Google Calendar API 認証成功")
+        return fetch_changes(service, calendar['id'], sync_token, http=get_thread_http(credentials))
+    except HttpError as e:
+        print(f"⚠️ カレンダー '{calendar_name}' アクセスエラー: {e}")
+        metrics.incr('google.calendar_errors')
+        return None
 
-        # 明日の日付範囲を計算
-        jst = pytz.timezone('Asia/Tokyo')
-        today_jst = datetime.datetime.now(jst).date()
-        tomorrow_jst_date = today_jst + datetime.timedelta(days=1)
-        
-        print(f"Google Calendar検索対象: {tomorrow_jst_date}")
-        
-        tomorrow_start_jst = datetime.datetime.combine(tomorrow_jst_date, datetime.time.min).replace(tzinfo=jst)
-        tomorrow_end_jst = datetime.datetime.combine(tomorrow_jst_date, datetime.time.max).replace(tzinfo=jst)
-        
-        tomorrow_start_utc = tomorrow_start_jst.astimezone(pytz.UTC)
-        tomorrow_end_utc = tomorrow_end_jst.astimezone(pytz.UTC)
+def _days(start_date, end_date):
+    """日付範囲（両端を含む）の日付一覧"""
+    return [start_date + datetime.timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+
+def _tomorrow():
+    """JSTの明日の日付"""
+    return datetime.datetime.now(JST).date() + datetime.timedelta(days=1)
+
+def _events_from_store(store, start_date, end_date, calendar_ids, days, degraded=False):
+    """ローカルストアから範囲内の予定を日付ごとに振り分ける（degraded: 同期できず保存済みの内容を使う場合）"""
+    count = 0
+    for event in store.events_between(start_date, end_date, calendar_ids):
+        date = datetime.date.fromisoformat(event['start_date'])
+        entry = {
+            'summary': event.get('summary', '名前なし'),
+            'start': event.get('start', {}),
+            'calendar': event['calendar'],
+            'source': 'google_calendar'
+        }
+        if degraded:
+            entry['degraded'] = True
+        days[date].append(entry)
+        count += 1
+        print(f"✅ Google予定: {date} {event.get('summary', '名前なし')} ({event['calendar']})")
+    return count
+
+def _synced_google_calendars(store):
+    """
+    ストアの同期済みカレンダー {calendar_id: synced_at}
+    同じストアに保存される CalendarBot の primary カレンダーは除く（カレンダーリストのものだけを使う同期と合わせる）
+    """
+    return {
+        calendar_id: synced_at for calendar_id, synced_at in store.synced_calendars().items()
+        if calendar_id != USER_CALENDAR_ID
+    }
+
+def get_stale_google_events_between(start_date, end_date, calendar_ids=None):
+    """Google に問い合わせず、保存済みの予定（古い可能性あり）を返す"""
+    days = {date: [] for date in _days(start_date, end_date)}
+    if not os.path.exists(EVENT_STORE_PATH):
+        return days
+    store = get_event_store()
+    synced = list(_synced_google_calendars(store))
+    if calendar_ids is not None:
+        synced = [calendar_id for calendar_id in synced if calendar_id in calendar_ids]
+    count = _events_from_store(store, start_date, end_date, synced, days, degraded=True)
+    print(f"📦 保存済みの Google予定を使用: {count}件")
+    return days
+
+def get_cached_google_events_between(start_date, end_date, max_age=None, calendar_ids=None):
+    """
+    ローカルストアの同期が max_age 秒以内なら、Google API を使わずにストアから予定を返す
+    ストアが古い・存在しない場合（calendar_ids 指定時は未同期のカレンダーがある場合も）は None
+    """
+    max_age = GOOGLE_CACHE_MAX_AGE if max_age is None else max_age
+    if max_age <= 0 or not os.path.exists(EVENT_STORE_PATH):
+        return None
+    store = get_event_store()
+    synced = _synced_google_calendars(store)
+    if calendar_ids is not None:
+        if any(calendar_id not in synced for calendar_id in calendar_ids):
+            return None
+        synced = {calendar_id: synced[calendar_id] for calendar_id in calendar_ids}
+    if not synced or time.time() - min(synced.values()) > max_age:
+        return None
+    
+    print(f"⚡ ローカルストアから取得（同期から{int(time.time() - min(synced.values()))}秒）")
+    days = {date: [] for date in _days(start_date, end_date)}
+    _events_from_store(store, start_date, end_date, list(synced), days)
+    return days
+
+def get_google_calendar_events_between(start_date, end_date, calendar_ids=None, deadline=None):
+    """
+    Google Calendarから日付範囲（両端を含む）の予定を日付ごとに取得
+    calendar_ids を指定した場合は、そのカレンダーだけを同期・取得する
+    deadline 秒以内に同期が終わらない・サーキットブレーカーが開いている・エラーの場合は、
+    保存済みの予定を degraded として返す（状態は google_status() で確認できる）
+    """
+    deadline = GOOGLE_DEADLINE_SECONDS if deadline is None else deadline
+    days, status, future = _request_google_sync(start_date, end_date, calendar_ids, deadline)
+    if future is not None:
+        days, status = _await_google_sync(future, start_date, end_date, calendar_ids, deadline)
+    set_google_status(status)
+    return days
+
+def _request_google_sync(start_date, end_date, calendar_ids, deadline):
+    """
+    ストアの予定で答えられるか・サーキットブレーカーを確認し、必要なら同期を始める
+    戻り値: (予定, 状態, None) または同期を始めた場合は (None, None, future)
+    """
+    if calendar_ids is not None and not calendar_ids:
+        # 使うカレンダーがない（既定のカレンダーが設定されていない地区など）
+        return {date: [] for date in _days(start_date, end_date)}, 'ok', None
+    
+    cached = get_cached_google_events_between(start_date, end_date, calendar_ids=calendar_ids)
+    if cached is not None:
+        return cached, 'ok', None
+    
+    if not google_breaker.allow():
+        print("⛔ Google Calendar は一時停止中です")
+        return get_stale_google_events_between(start_date, end_date, calendar_ids), 'circuit_open', None
+    
+    return None, None, _start_sync(start_date, end_date, calendar_ids, deadline)
+
+def _await_google_sync(future, start_date, end_date, calendar_ids, deadline, timeout=None):
+    """
+    同期の完了を timeout 秒（省略時は deadline 秒）まで待つ。戻り値: (予定, 状態)
+    サーキットブレーカーには同期ごとに1回だけ _start_sync で数えるので、ここでは数えない
+    """
+    timeout = deadline if timeout is None else max(timeout, 0)
+    try:
+        return future.result(timeout=timeout), 'ok'
+    except FutureTimeoutError:
+        print(f"⏱️ Google Calendar が {deadline}秒以内に応答しませんでした（同期はバックグラウンドで続けます）")
+        metrics.incr('google.deadline_exceeded')
+        return get_stale_google_events_between(start_date, end_date, calendar_ids), 'timeout'
+    except Exception as error:
+        print(f"❌ Google Calendar エラー: {error}")
+        return get_stale_google_events_between(start_date, end_date, calendar_ids), 'error'
+
+def _start_sync(start_date, end_date, calendar_ids, deadline=GOOGLE_DEADLINE_SECONDS):
+    """同期をバックグラウンドで開始（同じ範囲の同期が実行中ならそれを返す）deadline はサーキットブレーカーの判定に使う"""
+    key = (start_date, end_date, tuple(calendar_ids) if calendar_ids is not None else None)
+    with _sync_lock:
+        future = _inflight_syncs.get(key)
+        if future is not None:
+            metrics.incr('google.sync_coalesced')
+            return future
+        started = time.monotonic()
+        future = _sync_executor.submit(_sync_google_calendar_events_between, start_date, end_date, calendar_ids)
+        _inflight_syncs[key] = future
+    
+    def done(future):
+        with _sync_lock:
+            _inflight_syncs.pop(key, None)
+        # 待っている側がいくつあっても、1回の同期は1回だけ数える（期限を超えた同期は失敗）
+        if future.exception() is not None or time.monotonic() - started > deadline:
+            google_breaker.record_failure()
+        else:
+            google_breaker.record_success()
+    
+    future.add_done_callback(done)
+    return future
+
+def _sync_google_calendar_events_between(start_date, end_date, calendar_ids=None):
+    """Google Calendar と同期して範囲内の予定を取得（エラーは呼び出し元に伝える）"""
+    days = {date: [] for date in _days(start_date, end_date)}
+    print("🔐 Google Calendar認証中...")
+    
+    with metrics.stage('google.auth'):
+        credentials = get_service_account_credentials()
+        if credentials is None:
+            return days
         
-        # カレンダー一覧を取得
+        service = get_calendar_service(credentials)
+    print("✅ Google Calendar API 認証成功")
+    
+    if start_date == end_date:
+        print(f"Google Calendar検索対象: {start_date}")
+    else:
+        print(f"Google Calendar検索対象: {start_date} 〜 {end_date}")
+    
+    # カレンダー一覧を取得
+    with metrics.stage('google.calendar_list'):
         calendar_list = service.calendarList().list().execute()
-        calendars = calendar_list.get('items', [])
-        
-        print(f"利用可能なカレンダー: {len(calendars)}個")
-        
-        all_events = []
-        
-        # 各カレンダーから予定を取得
+    calendars = [
+        calendar for calendar in calendar_list.get('items', [])
+        if calendar.get('accessRole', 'Unknown') in ['reader', 'writer', 'owner']
+        and (calendar_ids is None or calendar['id'] in calendar_ids)
+    ]
+    
+    print(f"利用可能なカレンダー: {len(calendars)}個")
+    
+    # 各カレンダーの変更分を並列で取得し、ローカルストアに反映（カレンダー単位でエラーを分離）
+    store = get_event_store()
+    max_workers = max(1, min(MAX_CONCURRENT_CALENDARS, len(calendars)))
+    futures = {}
+    try:
         for calendar in calendars:
-            calendar_id = calendar['id']
+            future = _calendar_executor.submit(
+                _fetch_calendar_changes, service, credentials, calendar,
+                store.get_sync_token(calendar['id'])
+            )
+            futures[future] = calendar
+        # 同時実行数を超えた分は順番待ちになるため、待ち時間は波の数に比例させる
+        waves = -(-len(calendars) // max_workers)
+        done, not_done = wait(futures, timeout=CALENDAR_TIMEOUT_SECONDS * waves)
+        
+        synced_count = 0
+        for future in done:
+            calendar = futures[future]
             calendar_name = calendar.get('summary', 'Unknown')
-            access_role = calendar.get('accessRole', 'Unknown')
-            
-            if access_role not in ['reader', 'writer', 'writer', 'owner']:
-                continue
-            
             try:
-                events_result = service.events().list(
-                    calendarId=calendar_id,
-                    timeMin=tomorrow_start_utc.isoformat(),
-                    timeMax=tomorrow_end_utc.isoformat(),
-                    singleEvents=True,
-                    orderBy='startTime',
-                    maxResults=50
-                ).execute()
-                
-                events = events_result.get('items', [])
-                
-                for event in events:
-                    start = event.get('start', {})
-                    
-                    if 'dateTime' in start:
-                        start_datetime = datetime.datetime.fromisoformat(start['dateTime'].replace('Z', '+00:00'))
-                        event_date_jst = start_datetime.astimezone(jst).date()
-                    elif 'date' in start:
-                        event_date_jst = datetime.datetime.strptime(start['date'], '%Y-%m-%d').date()
-                    else:
-                        continue
-                    
-                    if event_date_jst == tomorrow_jst_date:
-                        all_events.append({
-                            'summary': event.get('summary', '名前なし'),
-                            'start': start,
-                            'calendar': calendar_name,
-                            'source': 'google_calendar'
-                        })
-                        print(f"✅ Google予定: {event.get('summary', '名前なし')} ({calendar_name})")
-                        
-            except HttpError as e:
-                print(f"⚠️ カレンダー '{calendar_name}' アクセスエラー: {e}")
+                changes = future.result()
+            except Exception as e:
+                print(f"⚠️ カレンダー '{calendar_name}' 取得エラー: {e}")
+                continue
+            if changes is None:
                 continue
+            items, next_sync_token, full_sync = changes
+            store.apply_changes(calendar['id'], calendar_name, items, next_sync_token, full_sync)
+            synced_count += 1
+            print(f"🔄 '{calendar_name}' 同期: {len(items)}件の変更{' (全件同期)' if full_sync else ''}")
         
-        print(f"Google Calendarから取得: {len(all_events)}件")
-        return all_events
-
-    except Exception as error:
-        print(f"❌ Google Calendar エラー: {error}")
-        return []
+        for future in not_done:
+            calendar_name = futures[future].get('summary', 'Unknown')
+            print(f"⏱️ カレンダー '{calendar_name}' タイムアウト ({CALENDAR_TIMEOUT_SECONDS}秒)")
+            metrics.incr('google.calendar_timeouts')
+    finally:
+        # 応答のないカレンダーを待たずに戻る（まだ始まっていない取得は取り消す）
+        for future in futures:
+            future.cancel()
+    
+    # 1つも同期できなければ失敗として扱う（サーキットブレーカーで数える）
+    if calendars and synced_count == 0:
+        raise RuntimeError("すべてのカレンダーの同期に失敗しました")
+    
+    # 範囲内の予定はローカルストアから1回で取得（同期に失敗したカレンダーは前回の内容を使う）
+    calendar_ids = [calendar['id'] for calendar in calendars]
+    count = _events_from_store(store, start_date, end_date, calendar_ids, days)
+    
+    print(f"Google Calendarから取得: {count}件")
+    return days
 
-def get_week_of_month(date):
-    """月の第何週目かを取得（1=第1週, 2=第2週, 3=第3週, 4=第4週, 5=第5週）"""
-    first_day_of_month = date.replace(day=1)
-    # その月の最初の日から数えて何週目か
-    week_number = (date.day - 1) // 7 + 1
-    return week_number
+def get_google_calendar_events(calendar_ids=None):
+    """Google Calendarから明日の予定を取得"""
+    tomorrow = _tomorrow()
+    return get_google_calendar_events_between(tomorrow, tomorrow, calendar_ids)[tomorrow]
 
-def get_fixed_schedule_events():
-    """固定スケジュールから明日の予定を取得"""
+def get_fixed_schedule_events_between(start_date, end_date, region=None):
+    """固定スケジュールから日付範囲（両端を含む）の予定を日付ごとに取得（region: 地区名、省略時は既定の地区）"""
     try:
         print("📅 固定スケジュール確認中...")
         
-        jst = pytz.timezone('Asia/Tokyo')
-        tomorrow = datetime.datetime.now(jst).date() + datetime.timedelta(days=1)
-        weekday = tomorrow.weekday()  # 0=月曜日, 6=日曜日
-        tomorrow_str = tomorrow.strftime('%Y-%m-%d')
-        week_of_month = get_week_of_month(tomorrow)
-        
-        weekday_names = ['月', '火', '水', '木', '金', '土', '日']
-        print(f"明日: {tomorrow_str} ({weekday_names[weekday]}曜日) - 第{week_of_month}週")
-        
-        events = []
+        # ルールエンジンの日付表から引く
+        with metrics.stage('fixed_schedule'):
+            days = get_schedule(region).events_between(start_date, end_date)
+        for date, events in days.items():
+            for event in events:
+                print(f"📅 定期予定: {date} {event['summary']}")
         
-        # 曜日別の基本スケジュール
-        if weekday == 0:  # 月曜日
-            events.append({
-                'summary': '燃えるごみ',
-                'start': {'date': tomorrow_str},
-                'source': 'fixed_schedule',
-                'type': 'weekly'
-            })
-            print(f"📅 定期予定: 燃えるごみ")
-            
-        elif weekday == 1:  # 火曜日
-            events.append({
-                'summary': 'プラスチックごみ',
-                'start': {'date': tomorrow_str},
-                'source': 'fixed_schedule',
-                'type': 'weekly'
-            })
-            print(f"📅 定期予定: プラスチックごみ")
-            
-        elif weekday == 2:  # 水曜日
-            # 瓶・缶・ペットボトルは毎週
-            events.append({
-                'summary': '瓶・缶・ペットボトルごみ',
-                'start': {'date': tomorrow_str},
-                'source': 'fixed_schedule',
-                'type': 'weekly'
-            })
-            print(f"📅 定期予定: 瓶・缶・ペットボトルごみ")
-            
-            # 紙ごみは2週目と4週目のみ
-            if week_of_month in [2, 4]:
-                events.append({
-                    'summary': '紙ごみ',
-                    'start': {'date': tomorrow_str},
-                    'source': 'fixed_schedule',
-                    'type': 'biweekly'
-                })
-                print(f"📅 定期予定: 紙ごみ (第{week_of_month}週)")
-                
-        elif weekday == 3:  # 木曜日
-            events.append({
-                'summary': '燃えるごみ',
-                'start': {'date': tomorrow_str},
-                'source': 'fixed_schedule',
-                'type': 'weekly'
-            })
-            print(f"📅 定期予定: 燃えるごみ")
-        
-        # 金曜・土曜・日曜は予定なし
-        
-        print(f"固定スケジュールから取得: {len(events)}件")
-        return events
+        print(f"固定スケジュールから取得: {sum(len(events) for events in days.values())}件")
+        return days
         
     except Exception as error:
         print(f"❌ 固定スケジュール エラー: {error}")
-        return []
+        return {date: [] for date in _days(start_date, end_date)}
+
+def get_fixed_schedule_events(region=None):
+    """固定スケジュールから明日の予定を取得"""
+    tomorrow = _tomorrow()
+    weekday = tomorrow.weekday()  # 0=月曜日, 6=日曜日
+    print(f"明日: {tomorrow.strftime('%Y-%m-%d')} ({WEEKDAY_NAMES[weekday]}曜日) - 第{get_week_of_month(tomorrow)}週")
+    return get_fixed_schedule_events_between(tomorrow, tomorrow, region)[tomorrow]
 
-def get_tomorrow_events():
+def merge_events_between(google_days, *other_days):
     """
-    ハイブリッドシステム: Google Calendar + 固定スケジュール
+    Google予定・ICS・固定スケジュールを日付ごとにまとめる（先に渡したソースを優先）
+    (日付, カテゴリ) が優先するソースの予定と一致するものは重複としてスキップする
     """
-    print("🔄 ハイブリッドシステムで予定取得開始...")
-    
-    all_events = []
+    with metrics.stage('dedup'):
+        days = {date: list(events) for date, events in google_days.items()}
+        seen_keys = {
+            (date, dedup_key(event))
+            for date, events in google_days.items()
+            for event in events
+        }
+        
+        for source_days in other_days:
+            source_keys = set()
+            for date, events in source_days.items():
+                all_events = days.setdefault(date, [])
+                for event in events:
+                    key = (date, dedup_key(event))
+                    if key in seen_keys:
+                        print(f"🔄 重複スキップ: {event['summary']} (優先するソースの予定と重複)")
+                        continue
+                    all_events.append(event)
+                    source_keys.add(key)
+            seen_keys |= source_keys
+        return dict(sorted(days.items(), key=lambda item: (item[0] is None, item[0])))
+
+def merge_events(google_events, *other_events):
+    """Google予定・ICS・固定スケジュールを重複チェックして1日分にまとめる"""
+    return merge_events_between({None: google_events}, *({None: events} for events in other_events))[None]
+
+def get_events_between(start_date, end_date, region=None, calendar_ids=None):
+    """
+    ハイブリッドシステム: 日付範囲（両端を含む）の予定を日付ごとに取得
+    Google Calendar はカレンダーごとに1回の同期で範囲全体をまかなう
+    """
+    google_days = get_google_calendar_events_between(start_date, end_date, calendar_ids)
+    ics_days = get_ics_events_between(start_date, end_date, region)
+    fixed_days = get_fixed_schedule_events_between(start_date, end_date, region)
+    return merge_events_between(google_days, ics_days, fixed_days)
+
+def get_tomorrow_events_by_district(districts):
+    """
+    複数の地区キー (地区, カレンダーID) の明日の予定をまとめて取得
+    Google Calendar の同期はカレンダーの組み合わせごとに1回だけ行い、地区ごとの ICS・固定スケジュールと組み合わせる
+    すべての組み合わせの同期を先に始め、1つの期限（GOOGLE_DEADLINE_SECONDS）で待つ
+    """
+    tomorrow = _tomorrow()
+    deadline = GOOGLE_DEADLINE_SECONDS
+    requests = {}
+    for _, calendar_ids in districts:
+        if calendar_ids not in requests:
+            requests[calendar_ids] = _request_google_sync(tomorrow, tomorrow, calendar_ids, deadline)
+    expires = time.monotonic() + deadline
     
-    # 1. Google Calendarから取得を試行
-    google_events = get_google_calendar_events()
-    if google_events:
-        all_events.extend(google_events)
+    google_events = {}
+    statuses = []
+    for calendar_ids, (days, status, future) in requests.items():
+        if future is not None:
+            days, status = _await_google_sync(
+                future, tomorrow, tomorrow, calendar_ids, deadline, expires - time.monotonic()
+            )
+        google_events[calendar_ids] = days[tomorrow]
+        statuses.append(status)
     
-    # 2. 固定スケジュールから取得
-    fixed_events = get_fixed_schedule_events()
+    events_by_district = {}
+    for region, calendar_ids in districts:
+        events_by_district[(region, calendar_ids)] = merge_events(
+            google_events[calendar_ids],
+            get_ics_events_between(tomorrow, tomorrow, region)[tomorrow],
+            get_fixed_schedule_events(region),
+        )
+    set_google_status(_worst_status(statuses))
+    return events_by_district
+
+def get_tomorrow_events_by_region(regions):
+    """
+    複数の地区の明日の予定をまとめて取得
+    Google Calendar の同期は1回だけ行い、地区ごとの ICS・固定スケジュールと組み合わせる
+    """
+    events_by_district = get_tomorrow_events_by_district([(region, None) for region in regions])
+    return {region: events_by_district[(region, None)] for region in regions}
+
+def get_tomorrow_events(region=None, calendar_ids=None):
+    """
+    ハイブリッドシステム: Google Calendar + 固定スケジュール
+    """
+    print("🔄 ハイブリッドシステムで予定取得開始...")
     
-    # 3. 重複チェックして固定スケジュールを追加
-    for fixed_event in fixed_events:
-        fixed_summary = fixed_event['summary'].lower()
-        
-        # Google予定と重複しているかチェック
-        is_duplicate = False
-        for google_event in google_events:
-            google_summary = google_event['summary'].lower()
-            # 部分一致で重複判定
-            garbage_keywords = ['ごみ', 'ゴミ', 'プラスチック', '紙', '瓶', '缶', 'ペット', '燃える']
-            if any(keyword in google_summary for keyword in garbage_keywords) and \
-               any(keyword in fixed_summary for keyword in garbage_keywords):
-                is_duplicate = True
-                print(f"🔄 重複スキップ: {fixed_event['summary']} (Google予定と重複)")
-                break
-        
-        if not is_duplicate:
-            all_events.append(fixed_event)
+    tomorrow = _tomorrow()
+    weekday = tomorrow.weekday()
+    print(f"明日: {tomorrow.strftime('%Y-%m-%d')} ({WEEKDAY_NAMES[weekday]}曜日) - 第{get_week_of_month(tomorrow)}週")
+    all_events = get_events_between(tomorrow, tomorrow, region, calendar_ids)[tomorrow]
     
-    # 4. 結果まとめ
-    google_count = len(google_events)
+    # 結果まとめ
+    google_count = len([e for e in all_events if e.get('source') == 'google_calendar'])
+    ics_count = len([e for e in all_events if e.get('source') == 'ics'])
     fixed_count = len([e for e in all_events if e.get('source') == 'fixed_schedule'])
     
     print(f"\n📊 ハイブリッド結果:")
     print(f"  Google Calendar: {google_count}件")
+    print(f"  ICS: {ics_count}件")
     print(f"  固定スケジュール: {fixed_count}件")
     print(f"  合計: {len(all_events)}件")
+    if google_status() != 'ok':
+        print(f"  ⚠️ Google Calendar {GOOGLE_STATUS_LABELS[google_status()]}（保存済みの予定で代替）")
     
     if all_events:
         print("📋 明日の予定一覧:")
         for event in all_events:
             source = event.get('source', 'unknown')
-            source_label = {'google_calendar': 'Google', 'fixed_schedule': '固定'}
+            source_label = {'google_calendar': 'Google', 'ics': 'ICS', 'fixed_schedule': '固定'}
             print(f"  ✅ {event['summary']} ({source_label.get(source, source)})")
     
     return all_events
@@ -263,7 +446,7 @@ if __name__ == "__main__":
         print(f"\n🎯 明日の予定 ({len(events)}件):")
         for i, event in enumerate(events, 1):
             source = event.get('source', 'unknown')
-            source_icon = {'google_calendar': '📱', 'fixed_schedule': '📅'}
+            source_icon = {'google_calendar': '📱', 'ics': '🗓️', 'fixed_schedule': '📅'}
             print(f"{i}. {source_icon.get(source, '❓')} {event['summary']}")
     else:
         print("\n📭 明日の予定はありません。")
\ No newline at end of file
@@ -0,0 +1,127 @@
+# guild_config.py
+# サーバー（ギルド）ごとの設定（通知チャンネル・地区・カレンダー）をローカルのSQLiteに保持する
+#
+# 同じ地区・カレンダーのサーバーは「地区キー」(地区, カレンダーID) が同じになり、予定の取得結果を共有する
+#
+# DEFAULT_CALENDAR_IDS="カレンダーID,カレンダーID,..."（カレンダーを指定していないサーバー・送信先が使う Google カレンダー）
+# 未設定の場合、カレンダーを指定していないサーバーは Google Calendar を使わない
+# （サービスアカウントに共有されたすべてのカレンダーを、どのサーバーにも見せないため）
+import os
+import json
+import sqlite3
+import threading
+
+GUILD_CONFIG_PATH = os.getenv('GUILD_CONFIG_PATH', 'guilds.db')
+DEFAULT_CALENDAR_IDS = tuple(sorted(
+    calendar_id.strip() for calendar_id in os.getenv('DEFAULT_CALENDAR_IDS', '').split(',') if calendar_id.strip()
+))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS guilds (
+    guild_id INTEGER PRIMARY KEY,
+    channel_id INTEGER,
+    region TEXT,
+    calendar_ids TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_guilds_district ON guilds (region, calendar_ids);
+"""
+
+def district_key(region=None, calendar_ids=None):
+    """地区キー (地区名 または None, カレンダーIDのタプル) を作る（カレンダーの指定がなければ DEFAULT_CALENDAR_IDS）"""
+    return (region or None, tuple(sorted(calendar_ids)) if calendar_ids else DEFAULT_CALENDAR_IDS)
+
+DEFAULT_DISTRICT = district_key()
+
+class GuildConfigStore:
+    """サーバーごとの設定（起動時に全件を読み込み、参照はメモリ上の辞書で行う）"""
+
+    def __init__(self, path=GUILD_CONFIG_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(_SCHEMA)
+        self._guilds = {}
+        self._data_version = None
+        self.reload()
+
+    def reload(self):
+        """全件を読み込み直す"""
+        with self._lock:
+            self._guilds = {
+                row['guild_id']: self._row_to_config(row)
+                for row in self._conn.execute("SELECT * FROM guilds")
+            }
+            self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def reload_if_changed(self):
+        """他のプロセス（別のシャード）が設定を変更していれば読み込み直す"""
+        with self._lock:
+            changed = self._conn.execute("PRAGMA data_version").fetchone()[0] != self._data_version
+        if changed:
+            self.reload()
+
+    @staticmethod
+    def _row_to_config(row):
+        calendar_ids = json.loads(row['calendar_ids']) if row['calendar_ids'] else None
+        return {
+            'guild_id': row['guild_id'],
+            'channel_id': row['channel_id'],
+            'region': row['region'],
+            'calendar_ids': calendar_ids,
+            'district': district_key(row['region'], calendar_ids),
+        }
+
+    def get(self, guild_id):
+        """サーバーの設定を取得（未設定なら None）"""
+        return self._guilds.get(guild_id)
+
+    def get_district(self, guild_id):
+        """サーバーの地区キーを取得（未設定なら既定の地区）"""
+        config = self._guilds.get(guild_id)
+        return config['district'] if config else DEFAULT_DISTRICT
+
+    def set(self, guild_id, channel_id=None, region=None, calendar_ids=None):
+        """サーバーの設定を登録・更新する"""
+        calendar_ids = sorted(calendar_ids) if calendar_ids else None
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO guilds VALUES (?, ?, ?, ?)",
+                (guild_id, channel_id, region, json.dumps(calendar_ids) if calendar_ids else None)
+            )
+            row = self._conn.execute("SELECT * FROM guilds WHERE guild_id = ?", (guild_id,)).fetchone()
+            self._guilds[guild_id] = self._row_to_config(row)
+        return self._guilds[guild_id]
+
+    def remove(self, guild_id):
+        """サーバーの設定を削除する"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM guilds WHERE guild_id = ?", (guild_id,))
+            self._guilds.pop(guild_id, None)
+
+    def all(self):
+        """すべてのサーバーの設定"""
+        return list(self._guilds.values())
+
+    def notify_targets(self):
+        """通知チャンネルが設定されたサーバーの送信先 {チャンネルID: 地区キー}"""
+        self.reload_if_changed()
+        return {
+            config['channel_id']: config['district']
+            for config in self._guilds.values() if config['channel_id']
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+# グローバルインスタンス
+guild_store = None
+_store_lock = threading.Lock()
+
+def get_guild_store():
+    """GuildConfigStoreのシングルトンインスタンスを取得"""
+    global guild_store
+    with _store_lock:
+        if guild_store is None:
+            guild_store = GuildConfigStore()
+        return guild_store
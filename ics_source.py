@@ -0,0 +1,333 @@
+# ics_source.py
+# 自治体などが公開している ICS（iCalendar）ファイルを読み込み、日付引きの表にする予定ソース
+# ネットワークを使わずに引けるので、Google Calendar が使えないときのフォールバックにもなる
+#
+# ICS_CALENDAR_PATHS="パス[|地区],パス[|地区],..."（地区を省略したファイルは全地区で使う）
+#
+# ファイルは1行ずつ読み、必要なプロパティ（SUMMARY / DTSTART / RRULE / RDATE / EXDATE / STATUS）だけを取り出す
+# RRULE は FREQ=DAILY/WEEKLY/MONTHLY/YEARLY と INTERVAL / COUNT / UNTIL / BYDAY / BYMONTHDAY / BYMONTH / BYSETPOS に対応
+# （BYWEEKNO / BYYEARDAY を含む予定は正しく展開できないので、警告を出して読み飛ばす）
+import os
+import calendar
+import datetime
+import threading
+from schedule_rules import HORIZON_DAYS, resolve_region
+
+# 日本時間（夏時間がないので固定オフセットで十分）
+JST = datetime.timezone(datetime.timedelta(hours=9), 'JST')
+
+ICS_CALENDAR_PATHS = os.getenv('ICS_CALENDAR_PATHS', '')
+
+# 過去のこの日数分も表に含める（前日分の問い合わせで作り直さないため）
+LOOKBACK_DAYS = 1
+
+_ICS_WEEKDAYS = {'MO': 0, 'TU': 1, 'WE': 2, 'TH': 3, 'FR': 4, 'SA': 5, 'SU': 6}
+_TEXT_ESCAPES = {'n': '\n', 'N': '\n', ',': ',', ';': ';', '\\': '\\'}
+# 対応していない RRULE の項目（無視すると余分な日に展開されてしまう）
+_UNSUPPORTED_RRULE_PARTS = ('BYWEEKNO', 'BYYEARDAY')
+
+def _unfold(lines):
+    """折り返された行（空白・タブで始まる行）をつなげて1プロパティずつ返す"""
+    current = None
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t'):
+            if current is not None:
+                current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current is not None:
+        yield current
+
+def _parse_property(line):
+    """'NAME;PARAM=VALUE:値' を (NAME, {PARAM: VALUE}, 値) に分ける"""
+    head, _, value = line.partition(':')
+    name, *params = head.split(';')
+    return name.upper(), dict(param.partition('=')[::2] for param in params), value
+
+def _unescape(text):
+    result = []
+    chars = iter(text)
+    for char in chars:
+        if char == '\\':
+            escaped = next(chars, '')
+            result.append(_TEXT_ESCAPES.get(escaped, escaped))
+        else:
+            result.append(char)
+    return ''.join(result)
+
+def _parse_datetime(value, params):
+    """DTSTART などの値を (日付, 時刻 または None) に変換（UTC 指定は JST に直す）"""
+    value = value.strip()
+    if params.get('VALUE') == 'DATE' or len(value) == 8:
+        return datetime.datetime.strptime(value, '%Y%m%d').date(), None
+    moment = datetime.datetime.strptime(value.rstrip('Z'), '%Y%m%dT%H%M%S')
+    if value.endswith('Z'):
+        moment = moment.replace(tzinfo=datetime.timezone.utc).astimezone(JST)
+    # TZID 付き・タイムゾーンなしの時刻は日本時間として扱う
+    return moment.date(), moment.time().replace(tzinfo=None)
+
+def _parse_rrule(value):
+    rule = {}
+    for part in value.split(';'):
+        key, _, item = part.partition('=')
+        rule[key.upper()] = item
+    return rule
+
+def iter_vevents(lines):
+    """ICS の行から VEVENT を1件ずつ辞書で返す（ファイル全体を読み込まずに処理する）"""
+    event = None
+    # VEVENT の中の VALARM などの深さ（中のプロパティは予定のものではないので読まない）
+    nested = 0
+    for line in _unfold(lines):
+        if not line:
+            continue
+        name, params, value = _parse_property(line)
+        if name == 'BEGIN' and value.upper() == 'VEVENT':
+            event = {'rdates': [], 'exdates': []}
+            nested = 0
+        elif event is None:
+            continue
+        elif name == 'BEGIN':
+            nested += 1
+        elif name == 'END' and nested:
+            nested -= 1
+        elif nested:
+            continue
+        elif name == 'END' and value.upper() == 'VEVENT':
+            if 'dtstart' in event:
+                yield event
+            event = None
+        elif name == 'SUMMARY':
+            event['summary'] = _unescape(value)
+        elif name == 'DTSTART':
+            event['dtstart'] = _parse_datetime(value, params)
+        elif name == 'RRULE':
+            event['rrule'] = _parse_rrule(value)
+        elif name == 'RDATE':
+            event['rdates'].extend(_parse_datetime(item, params)[0] for item in value.split(','))
+        elif name == 'EXDATE':
+            event['exdates'].extend(_parse_datetime(item, params)[0] for item in value.split(','))
+        elif name == 'STATUS':
+            event['status'] = value.upper()
+
+def _nth_weekday_matches(date, ordinal):
+    """その月の第 ordinal 週（負の値は末尾から数える）の曜日かどうか"""
+    if ordinal > 0:
+        return (date.day - 1) // 7 + 1 == ordinal
+    days_in_month = calendar.monthrange(date.year, date.month)[1]
+    return -((days_in_month - date.day) // 7 + 1) == ordinal
+
+def _compile_rrule(rule, dtstart):
+    """RRULE を「その日が繰り返しに含まれるか」を判定する関数に変換（対応していない項目があれば ValueError）"""
+    unsupported = [part for part in _UNSUPPORTED_RRULE_PARTS if rule.get(part)]
+    if unsupported:
+        raise ValueError(f"未対応の RRULE の項目: {', '.join(unsupported)}")
+    freq = rule.get('FREQ', 'DAILY').upper()
+    interval = int(rule.get('INTERVAL', '1') or 1)
+    by_month = {int(month) for month in rule['BYMONTH'].split(',')} if rule.get('BYMONTH') else None
+    by_month_day = {int(day) for day in rule['BYMONTHDAY'].split(',')} if rule.get('BYMONTHDAY') else None
+    # BYDAY: [(曜日, 第n週 または None)]
+    by_day = None
+    if rule.get('BYDAY'):
+        by_day = []
+        for item in rule['BYDAY'].split(','):
+            item = item.strip().upper()
+            ordinal = item[:-2]
+            by_day.append((_ICS_WEEKDAYS[item[-2:]], int(ordinal) if ordinal not in ('', '+') else None))
+    set_positions = [int(pos) for pos in rule['BYSETPOS'].split(',')] if rule.get('BYSETPOS') else None
+
+    # 指定のない項目は DTSTART から補う
+    if freq == 'WEEKLY' and by_day is None:
+        by_day = [(dtstart.weekday(), None)]
+    if freq == 'MONTHLY' and by_day is None and by_month_day is None:
+        by_month_day = {dtstart.day}
+    if freq == 'YEARLY' and by_day is None and by_month_day is None:
+        by_month = by_month or {dtstart.month}
+        by_month_day = {dtstart.day}
+    start_week = dtstart - datetime.timedelta(days=dtstart.weekday())
+
+    def in_rule(date):
+        if freq == 'DAILY':
+            period = (date - dtstart).days
+        elif freq == 'WEEKLY':
+            period = (date - start_week).days // 7
+        elif freq == 'MONTHLY':
+            period = (date.year - dtstart.year) * 12 + date.month - dtstart.month
+        else:
+            period = date.year - dtstart.year
+        if period % interval:
+            return False
+        if by_month is not None and date.month not in by_month:
+            return False
+        if by_month_day is not None:
+            days_in_month = calendar.monthrange(date.year, date.month)[1]
+            if date.day not in by_month_day and date.day - days_in_month - 1 not in by_month_day:
+                return False
+        if by_day is not None:
+            return any(
+                weekday == date.weekday() and (ordinal is None or _nth_weekday_matches(date, ordinal))
+                for weekday, ordinal in by_day
+            )
+        return True
+
+    if set_positions is None:
+        return in_rule
+
+    def period_bounds(date):
+        """BYSETPOS で数える範囲（FREQ の1期間）の最初と最後の日"""
+        if freq == 'WEEKLY':
+            first = date - datetime.timedelta(days=date.weekday())
+            return first, first + datetime.timedelta(days=6)
+        if freq == 'MONTHLY':
+            first = date.replace(day=1)
+            return first, date.replace(day=calendar.monthrange(date.year, date.month)[1])
+        if freq == 'YEARLY':
+            return date.replace(month=1, day=1), date.replace(month=12, day=31)
+        return date, date
+
+    # 期間の最初の日 → その期間で BYSETPOS に選ばれた日
+    selected = {}
+
+    def matches(date):
+        first, last = period_bounds(date)
+        if first not in selected:
+            candidates = [
+                first + datetime.timedelta(days=offset)
+                for offset in range((last - first).days + 1)
+                if in_rule(first + datetime.timedelta(days=offset))
+            ]
+            selected[first] = {
+                candidates[pos - 1 if pos > 0 else pos]
+                for pos in set_positions
+                if pos and -len(candidates) <= pos <= len(candidates)
+            }
+        return date in selected[first]
+
+    return matches
+
+def expand_event(event, start_date, end_date):
+    """VEVENT の開催日のうち、範囲（start_date 以上 end_date 未満）に含まれるものを返す"""
+    dtstart, _ = event['dtstart']
+    dates = set()
+    rule = event.get('rrule')
+    if rule is None:
+        dates.add(dtstart)
+    else:
+        until = _parse_datetime(rule['UNTIL'], {})[0] if rule.get('UNTIL') else None
+        count = int(rule['COUNT']) if rule.get('COUNT') else None
+        matches = _compile_rrule(rule, dtstart)
+        last = end_date - datetime.timedelta(days=1)
+        if until is not None:
+            last = min(last, until)
+        # COUNT は DTSTART から数えるので、その場合は DTSTART から順に調べる
+        date = dtstart if count is not None else max(dtstart, start_date)
+        occurrences = 0
+        while date <= last:
+            if date == dtstart or matches(date):
+                occurrences += 1
+                if count is not None and occurrences > count:
+                    break
+                dates.add(date)
+            date += datetime.timedelta(days=1)
+    dates.update(event['rdates'])
+    dates.difference_update(event['exdates'])
+    return sorted(date for date in dates if start_date <= date < end_date)
+
+class IcsCalendar:
+    """1つの ICS ファイルと、それを展開した日付→予定の表（ファイルが更新されたら読み直す）"""
+
+    def __init__(self, path, horizon_days=HORIZON_DAYS):
+        self.path = path
+        self.horizon_days = horizon_days
+        self._table = {}
+        self._start = None
+        self._end = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def compile(self, start_date):
+        """start_date から horizon_days 日分の表を作成する"""
+        end_date = start_date + datetime.timedelta(days=self.horizon_days)
+        mtime = os.path.getmtime(self.path)
+        table = {}
+        summaries = {}
+        with open(self.path, encoding='utf-8') as f:
+            for event in iter_vevents(f):
+                if event.get('status') == 'CANCELLED':
+                    continue
+                # 同じ件名は1つの文字列を共有する
+                summary = summaries.setdefault(event.get('summary', '名前なし'), event.get('summary', '名前なし'))
+                time = event['dtstart'][1]
+                entry = (summary, time.strftime('%H:%M:%S') if time else None)
+                try:
+                    dates = expand_event(event, start_date, end_date)
+                except ValueError as e:
+                    print(f"⚠️ ICSの予定を読み飛ばしました ({summary}): {e}")
+                    continue
+                for date in dates:
+                    table.setdefault(date, []).append(entry)
+        self._table = {date: tuple(entries) for date, entries in table.items()}
+        self._start = start_date
+        self._end = end_date
+        self._mtime = mtime
+        print(f"🗓️ ICS読み込み: {os.path.basename(self.path)} ({sum(len(e) for e in self._table.values())}件)")
+
+    def entries_on(self, date):
+        """指定日の (summary, 時刻 または None) 一覧を取得（表の範囲外・ファイル更新時は作り直す）"""
+        with self._lock:
+            if (self._start is None or not (self._start <= date < self._end)
+                    or os.path.getmtime(self.path) != self._mtime):
+                self.compile(date - datetime.timedelta(days=LOOKBACK_DAYS))
+            return self._table.get(date, ())
+
+def _event(date, summary, time):
+    date_str = date.strftime('%Y-%m-%d')
+    start = {'dateTime': f"{date_str}T{time}+09:00"} if time else {'date': date_str}
+    return {'summary': summary, 'start': start, 'source': 'ics'}
+
+_lock = threading.Lock()
+_calendars = None
+
+def _get_calendars():
+    """設定された ICS ファイル一覧 [(IcsCalendar, 地区 または None)]（初回のみ構築）"""
+    global _calendars
+    with _lock:
+        if _calendars is None:
+            _calendars = []
+            for entry in ICS_CALENDAR_PATHS.split(','):
+                entry = entry.strip()
+                if not entry:
+                    continue
+                path, _, region = entry.partition('|')
+                _calendars.append((IcsCalendar(path.strip()), region.strip() or None))
+        return _calendars
+
+def is_configured():
+    """ICS ファイルが設定されているか"""
+    return bool(_get_calendars())
+
+def get_ics_events_between(start_date, end_date, region=None):
+    """ICS ファイルから日付範囲（両端を含む）の予定を日付ごとに取得（地区を指定しないファイルは全地区で使う）"""
+    days = {}
+    date = start_date
+    while date <= end_date:
+        days[date] = []
+        date += datetime.timedelta(days=1)
+    # 地区の指定なし（None）と既定の地区名は同じ地区として比べる
+    region = resolve_region(region)
+    for ics_calendar, ics_region in _get_calendars():
+        if ics_region is not None and resolve_region(ics_region) != region:
+            continue
+        try:
+            for date, events in days.items():
+                events.extend(_event(date, summary, time) for summary, time in ics_calendar.entries_on(date))
+        except (OSError, ValueError) as e:
+            print(f"⚠️ ICS読み込みエラー ({ics_calendar.path}): {e}")
+    return days
+
+def get_ics_events_on(date, region=None):
+    """ICS ファイルから指定日の予定を取得"""
+    return get_ics_events_between(date, date, region)[date]
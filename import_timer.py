@@ -0,0 +1,41 @@
+# import_timer.py
+# 起動時のインポート時間を計測してレポートする（IMPORT_TIME_REPORT=1 のときだけ有効）
+import os
+import sys
+import time
+import builtins
+import threading
+
+IMPORT_TIME_REPORT = os.getenv('IMPORT_TIME_REPORT', '').lower() in ('1', 'true', 'yes')
+
+_original_import = builtins.__import__
+_timings = {}
+_state = threading.local()
+_started = time.perf_counter()
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    """最も外側の import だけを、サブモジュールの読み込みも含めた時間で記録する"""
+    top_level = name.partition('.')[0]
+    if getattr(_state, 'depth', 0) or level or top_level in sys.modules:
+        return _original_import(name, globals, locals, fromlist, level)
+    _state.depth = 1
+    started = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        _state.depth = 0
+        _timings[top_level] = _timings.get(top_level, 0.0) + time.perf_counter() - started
+
+def install():
+    """インポート時間の計測を開始（IMPORT_TIME_REPORT が無効なら何もしない）"""
+    if IMPORT_TIME_REPORT and builtins.__import__ is not _timed_import:
+        builtins.__import__ = _timed_import
+
+def report():
+    """インポート時間のレポートを表示"""
+    if not IMPORT_TIME_REPORT:
+        return
+    builtins.__import__ = _original_import
+    print(f"📦 インポート時間レポート（読み込み済みモジュール: {len(sys.modules)}個 / 起動から {(time.perf_counter() - _started) * 1000:.1f}ms）")
+    for name, seconds in sorted(_timings.items(), key=lambda item: item[1], reverse=True):
+        print(f"  {seconds * 1000:8.1f}ms  {name}")
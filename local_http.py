@@ -0,0 +1,67 @@
+# local_http.py
+# Bot プロセス内で動く最小限の HTTP サーバー（メトリクス出力などに使う）
+import asyncio
+
+# (メソッド, パス) → ハンドラ  ハンドラは (method, path, headers, body) を受け取り (status, content_type, body) を返す
+_routes = {}
+_server = None
+
+_REASONS = {200: 'OK', 204: 'No Content', 400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found', 500: 'Internal Server Error'}
+
+def route(method, path):
+    """ハンドラを登録するデコレータ（ハンドラは通常の関数でもコルーチン関数でもよい）"""
+    def decorator(handler):
+        _routes[(method.upper(), path)] = handler
+        return handler
+    return decorator
+
+async def _handle(reader, writer):
+    try:
+        request_line = await reader.readline()
+        if not request_line:
+            return
+        method, target, _ = request_line.decode('latin-1').split(' ', 2)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            key, _, value = line.decode('latin-1').partition(':')
+            headers[key.strip().lower()] = value.strip()
+        length = int(headers.get('content-length') or 0)
+        body = await reader.readexactly(length) if length else b''
+
+        path = target.split('?', 1)[0]
+        handler = _routes.get((method.upper(), path))
+        if handler is None:
+            status, content_type, payload = 404, 'text/plain', 'not found'
+        else:
+            try:
+                result = handler(method, path, headers, body)
+                if asyncio.iscoroutine(result):
+                    result = await result
+                status, content_type, payload = result
+            except Exception as e:
+                print(f"❌ HTTPハンドラ エラー: {e}")
+                status, content_type, payload = 500, 'text/plain', 'error'
+
+        data = payload.encode('utf-8') if isinstance(payload, str) else (payload or b'')
+        writer.write(
+            f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+            f"Content-Type: {content_type}; charset=utf-8\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            "Connection: close\r\n\r\n".encode('latin-1') + data
+        )
+        await writer.drain()
+    except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+async def start(host, port):
+    """サーバーを起動（既に起動済みなら何もしない）"""
+    global _server
+    if _server is None:
+        _server = await asyncio.start_server(_handle, host, port)
+        print(f"🌐 ローカルHTTPサーバー起動: {host}:{port}")
+    return _server
@@ -0,0 +1,137 @@
+# metrics.py
+# 処理ステージごとの所要時間とカウンタを集計する軽量な計測レイヤー
+# METRICS_ENABLED が無効のときは何もしないオブジェクトを返すだけなので、ほぼコストはかからない
+import os
+import re
+import json
+import time
+import threading
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '').lower() in ('1', 'true', 'yes')
+
+_lock = threading.Lock()
+_timers = {}
+_counters = {}
+_gauges = {}
+
+class _NullStage:
+    """計測無効時のステージ（何もしない）"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_STAGE = _NullStage()
+
+class _Stage:
+    """with ブロックの所要時間を記録するステージ"""
+
+    __slots__ = ('name', 'started')
+
+    def __init__(self, name):
+        self.name = name
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.name, time.perf_counter() - self.started)
+        if exc_type is not None:
+            incr(f'{self.name}.errors')
+        return False
+
+def enable(enabled=True):
+    """計測の有効・無効を切り替える"""
+    global METRICS_ENABLED
+    METRICS_ENABLED = enabled
+
+def stage(name):
+    """ステージの計測用コンテキストマネージャ（with metrics.stage('auth'): ...）"""
+    if not METRICS_ENABLED:
+        return _NULL_STAGE
+    return _Stage(name)
+
+def observe(name, seconds):
+    """ステージの所要時間（秒）を記録"""
+    if not METRICS_ENABLED:
+        return
+    with _lock:
+        timer = _timers.get(name)
+        if timer is None:
+            timer = _timers[name] = [0, 0.0, 0.0]  # 回数, 合計, 最大
+        timer[0] += 1
+        timer[1] += seconds
+        if seconds > timer[2]:
+            timer[2] = seconds
+
+def incr(name, value=1):
+    """カウンタを加算"""
+    if not METRICS_ENABLED:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+def set_gauge(name, value):
+    """ゲージ（現在値）を設定"""
+    if not METRICS_ENABLED:
+        return
+    with _lock:
+        _gauges[name] = value
+
+def snapshot():
+    """現在の集計結果を辞書で取得"""
+    with _lock:
+        return {
+            'stages': {
+                name: {'count': count, 'total_ms': round(total * 1000, 3), 'max_ms': round(peak * 1000, 3)}
+                for name, (count, total, peak) in _timers.items()
+            },
+            'counters': dict(_counters),
+            'gauges': dict(_gauges),
+        }
+
+def reset():
+    """集計結果を消去"""
+    with _lock:
+        _timers.clear()
+        _counters.clear()
+        _gauges.clear()
+
+def _metric_name(name):
+    return 'gomidasi_' + re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+def render_prometheus():
+    """Prometheus のテキスト形式で出力"""
+    data = snapshot()
+    lines = [
+        '# TYPE gomidasi_stage_seconds summary',
+    ]
+    for name, stats in sorted(data['stages'].items()):
+        lines.append(f'gomidasi_stage_seconds_count{{stage="{name}"}} {stats["count"]}')
+        lines.append(f'gomidasi_stage_seconds_sum{{stage="{name}"}} {stats["total_ms"] / 1000:.6f}')
+    lines.append('# TYPE gomidasi_stage_seconds_max gauge')
+    for name, stats in sorted(data['stages'].items()):
+        lines.append(f'gomidasi_stage_seconds_max{{stage="{name}"}} {stats["max_ms"] / 1000:.6f}')
+    for name, value in sorted(data['counters'].items()):
+        metric = _metric_name(name) + '_total'
+        lines.append(f'# TYPE {metric} counter')
+        lines.append(f'{metric} {value}')
+    for name, value in sorted(data['gauges'].items()):
+        metric = _metric_name(name)
+        lines.append(f'# TYPE {metric} gauge')
+        lines.append(f'{metric} {value}')
+    return '\n'.join(lines) + '\n'
+
+def render_json():
+    """JSON 形式で出力"""
+    return json.dumps(snapshot(), ensure_ascii=False)
+
+def emit_summary(label):
+    """集計結果を1行のJSONとして出力（計測無効時は何もしない）"""
+    if not METRICS_ENABLED:
+        return
+    print(json.dumps({'metrics': label, **snapshot()}, ensure_ascii=False))
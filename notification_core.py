@@ -0,0 +1,241 @@
+# notification_core.py
+# 予定通知の共通処理（送信先・予定の取得・メッセージの作成・並列送信・送信済みの日付）
+# notification_script（定時実行のスクリプト）と常駐Botの notification_scheduler・reminders から使う
+import asyncio
+import os
+import json
+import datetime
+import metrics
+import ics_source
+from guild_config import DEFAULT_DISTRICT, GUILD_CONFIG_PATH, district_key
+from schedule_rules import get_schedule
+
+# 日本時間（夏時間がないので固定オフセットで十分）
+JST = datetime.timezone(datetime.timedelta(hours=9), 'JST')
+
+# 同時に送信する数・1秒あたりの送信数（Discordのグローバル上限 50回/秒 より低く抑える）
+NOTIFY_CONCURRENCY = int(os.getenv('NOTIFY_CONCURRENCY', '5'))
+NOTIFY_RATE_PER_SECOND = float(os.getenv('NOTIFY_RATE_PER_SECOND', '20'))
+NOTIFY_MAX_RETRIES = 3
+
+# 常駐Botが定時通知を送る設定（このときスクリプトからは送らない）
+IN_PROCESS_NOTIFY = os.getenv('IN_PROCESS_NOTIFY', '').lower() in ('1', 'true', 'yes')
+# 送信済みの日付（常駐Botのスケジューラとこのスクリプトの両方が確認し、同じ日に2回送らない）
+NOTIFY_STATE_PATH = os.getenv('NOTIFY_STATE_PATH', 'notification_state.json')
+# 送信済みでも送る（手動での再送用）
+NOTIFY_FORCE = os.getenv('NOTIFY_FORCE', '').lower() in ('1', 'true', 'yes')
+
+def load_last_sent():
+    """最後に通知を送った日付（未送信なら None）"""
+    try:
+        with open(NOTIFY_STATE_PATH) as f:
+            return datetime.date.fromisoformat(json.load(f)['last_sent'])
+    except (OSError, ValueError, KeyError):
+        return None
+
+def save_last_sent(date):
+    from calendar_service import write_file_atomic
+    write_file_atomic(NOTIFY_STATE_PATH, json.dumps({'last_sent': date.isoformat()}))
+
+def get_fallback_schedule(region=None, source='fallback'):
+    """完全フォールバック: ICS ファイル（設定されていれば）とルールエンジンの固定スケジュール"""
+    try:
+        tomorrow = datetime.datetime.now(JST).date() + datetime.timedelta(days=1)
+        
+        # 地域のごみ出しスケジュール
+        fixed_events = get_schedule(region).events_on(tomorrow, source=source)
+        ics_events = ics_source.get_ics_events_on(tomorrow, region)
+        if not ics_events:
+            return fixed_events
+        
+        # ICS と同じ種類の固定スケジュールは重複としてスキップする
+        from event_classifier import dedup_key
+        ics_keys = {dedup_key(event) for event in ics_events}
+        return ics_events + [event for event in fixed_events if dedup_key(event) not in ics_keys]
+    
+    except Exception:
+        return []
+
+def parse_targets():
+    """
+    送信先チャンネルと地区（スケジュールプロファイル）を取得
+    NOTIFY_CHANNEL_IDS="ID[:地区],ID[:地区],..." が優先、なければ NOTIFY_CHANNEL_ID
+    戻り値: {チャンネルID: 地区名 または None(既定の地区)}
+    """
+    targets = {}
+    channel_ids_str = os.getenv('NOTIFY_CHANNEL_IDS') or os.getenv('NOTIFY_CHANNEL_ID') or ''
+    for entry in channel_ids_str.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        channel_id_str, _, region = entry.partition(':')
+        targets[int(channel_id_str)] = region.strip() or None
+    return targets
+
+def get_notify_targets():
+    """
+    通知の送信先チャンネルと地区キーを取得
+    環境変数の送信先に、サーバーごとの設定（guilds.db がある場合）を加える
+    戻り値: {チャンネルID: 地区キー (地区, カレンダーID)}
+    """
+    targets = {channel_id: district_key(region) for channel_id, region in parse_targets().items()}
+    if os.path.exists(GUILD_CONFIG_PATH):
+        from guild_config import get_guild_store
+        targets.update(get_guild_store().notify_targets())
+    return targets
+
+def collect_events(districts):
+    """地区キーごとの明日の予定を取得 戻り値: ({地区キー: 予定一覧}, システム状況)"""
+    try:
+        print("📅 ハイブリッドシステム開始...")
+        
+        # Google Calendar が設定されていなければ Google 関連のモジュールは読み込まない
+        if not os.getenv('GOOGLE_SERVICE_ACCOUNT_KEY'):
+            print("⚠️ GOOGLE_SERVICE_ACCOUNT_KEY が設定されていません")
+            events_by_district = {
+                district: get_fallback_schedule(district[0], source='fixed_schedule') for district in districts
+            }
+            if ics_source.is_configured():
+                return events_by_district, "✅ ICS + 固定スケジュール"
+            return events_by_district, "⚠️ 固定スケジュールのみ"
+        
+        # google_calendar モジュールをインポート
+        try:
+            import google_calendar
+            print("✅ google_calendar モジュールのインポート成功")
+        except ImportError as e:
+            print(f"❌ google_calendar モジュールのインポートエラー: {e}")
+            # フォールバック: 固定スケジュールのみ
+            return {
+                district: get_fallback_schedule(district[0]) for district in districts
+            }, "⚠️ 固定スケジュールのみ"
+        
+        # ハイブリッドシステムで予定取得（Google Calendar はカレンダーの組み合わせごとに1回だけ取得）
+        if list(districts) == [DEFAULT_DISTRICT]:
+            events_by_district = {DEFAULT_DISTRICT: google_calendar.get_tomorrow_events(*DEFAULT_DISTRICT)}
+        else:
+            events_by_district = google_calendar.get_tomorrow_events_by_district(districts)
+        
+        # Google Calendar が期限内に応答しなかった場合などは、保存済みの予定と固定スケジュールで送る
+        status = google_calendar.google_status()
+        if status != 'ok':
+            return events_by_district, f"⚠️ フォールバック動作（Google Calendar {google_calendar.GOOGLE_STATUS_LABELS[status]}）"
+        return events_by_district, "✅ ハイブリッドシステム"
+    
+    except Exception as e:
+        print(f"⚠️ ハイブリッドシステム エラー: {str(e)}")
+        # 完全フォールバック
+        return {district: get_fallback_schedule(district[0]) for district in districts}, "⚠️ フォールバック動作"
+
+def render_notification(tomorrow_events, calendar_status, current_time):
+    """通知メッセージを作成"""
+    if tomorrow_events:
+        # 予定ありの場合
+        event_messages = []
+        google_count = 0
+        ics_count = 0
+        fixed_count = 0
+        fallback_count = 0
+        
+        for event in tomorrow_events:
+            source = event.get('source', 'unknown')
+            if source == 'google_calendar':
+                google_count += 1
+                event_messages.append(f"📱 **{event['summary']}**")
+            elif source == 'ics':
+                ics_count += 1
+                event_messages.append(f"🗓️ **{event['summary']}**")
+            elif source == 'fixed_schedule':
+                fixed_count += 1
+                event_messages.append(f"📅 **{event['summary']}**")
+            elif source == 'fallback':
+                fallback_count += 1
+                event_messages.append(f"🔄 **{event['summary']}**")
+            else:
+                event_messages.append(f"❓ **{event['summary']}**")
+        
+        # システム情報
+        system_info = []
+        if google_count > 0:
+            system_info.append(f"📱 Google Calendar: {google_count}件")
+        if ics_count > 0:
+            system_info.append(f"🗓️ ICS: {ics_count}件")
+        if fixed_count > 0:
+            system_info.append(f"📅 固定スケジュール: {fixed_count}件")
+        if fallback_count > 0:
+            system_info.append(f"🔄 フォールバック: {fallback_count}件")
+        
+        return f"""📅 **明日の予定** ({len(tomorrow_events)}件)
+
+{chr(10).join(event_messages)}
+
+🔄 **システム状況**: {calendar_status}
+📊 **内訳**: {' / '.join(system_info)}
+🕘 **通知時刻**: {current_time.strftime('%Y年%m月%d日 %H:%M')}"""
+    
+    # 予定なしの場合
+    return f"""📅 **明日の予定**
+
+明日の予定はありません。
+
+🔄 **システム状況**: {calendar_status}
+🕘 **通知時刻**: {current_time.strftime('%Y年%m月%d日 %H:%M')}"""
+
+async def deliver_all(messages, send):
+    """
+    送信先ごとのメッセージを並列で送信する
+    send(送信先, テキスト) は送信用のコルーチン関数
+    送信数と送信間隔を制限し、429（レート制限）は retry_after だけ待って再送する
+    戻り値: {送信先: None(成功) または エラー内容}
+    """
+    queue = asyncio.Queue()
+    for target, text in messages.items():
+        queue.put_nowait((target, text))
+    
+    results = {}
+    interval = 1.0 / NOTIFY_RATE_PER_SECOND if NOTIFY_RATE_PER_SECOND > 0 else 0
+    pacing_lock = asyncio.Lock()
+    
+    async def wait_for_slot():
+        # 送信開始の間隔を空けてグローバルのレート制限に当たらないようにする
+        async with pacing_lock:
+            await asyncio.sleep(interval)
+    
+    async def worker():
+        while True:
+            try:
+                target, text = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            for attempt in range(NOTIFY_MAX_RETRIES):
+                try:
+                    await wait_for_slot()
+                    with metrics.stage('discord.send'):
+                        await send(target, text)
+                    results[target] = None
+                    metrics.incr('discord.send.ok')
+                    break
+                except Exception as e:
+                    if getattr(e, 'status', None) == 429 and attempt + 1 < NOTIFY_MAX_RETRIES:
+                        retry_after = getattr(e, 'retry_after', None) or 1.0
+                        print(f"⏳ レート制限のため {retry_after}秒待機")
+                        await asyncio.sleep(retry_after)
+                        continue
+                    results[target] = str(e)
+                    metrics.incr('discord.send.failed')
+                    break
+    
+    workers = max(1, min(NOTIFY_CONCURRENCY, len(messages)))
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    return results
+
+def report_results(results, label='チャンネル'):
+    """送信結果を表示し、失敗した送信先を返す"""
+    succeeded = [target for target, error in results.items() if error is None]
+    print(f"✅ 通知を送信しました: {len(succeeded)}/{len(results)}{label}")
+    failed = {}
+    for target, error in results.items():
+        if error is not None:
+            print(f"❌ 送信失敗: {error}")
+            failed[target] = error
+    return failed
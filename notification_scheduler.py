@@ -0,0 +1,126 @@
+# notification_scheduler.py
+# 常駐Botのプロセス内で毎日の予定通知を送るスケジューラ
+# 送信時刻の少し前にメッセージを作成しておき、時刻になったらすぐに送信する
+# 送信済みの日付を保存しておき、再起動などで送信時刻を逃した場合は起動時に送り直す
+import os
+import asyncio
+import datetime
+import metrics
+import notification_core
+from client_profile import channel_cache
+from outbound_queue import send_message
+from response_cache import response_cache
+# 送信済みの日付は notification_script と共有する（同じ日に2回送らない）
+from notification_core import (
+    JST, collect_events, deliver_all, get_notify_targets, load_last_sent, render_notification, save_last_sent
+)
+
+IN_PROCESS_NOTIFY = notification_core.IN_PROCESS_NOTIFY
+NOTIFY_TIME = os.getenv('NOTIFY_TIME', '21:00')
+# 送信時刻の何分前にメッセージを作成しておくか
+PRERENDER_MINUTES = int(os.getenv('NOTIFY_PRERENDER_MINUTES', '10'))
+# 送信時刻を過ぎてから何時間以内なら、起動時に送り直すか
+MISSED_RUN_GRACE_HOURS = float(os.getenv('NOTIFY_MISSED_GRACE_HOURS', '3'))
+
+def _notify_time():
+    hour, minute = NOTIFY_TIME.split(':')
+    return datetime.time(int(hour), int(minute), tzinfo=JST)
+
+def _slot_on(date):
+    """指定日の送信時刻"""
+    return datetime.datetime.combine(date, _notify_time())
+
+async def _sleep_until(when):
+    """指定時刻まで待つ（長時間の sleep による誤差をなくすため、最後は短い間隔で合わせる）"""
+    while True:
+        remaining = (when - datetime.datetime.now(JST)).total_seconds()
+        if remaining <= 0:
+            return
+        await asyncio.sleep(min(remaining, 60) if remaining > 1 else remaining)
+
+class NotificationScheduler:
+    """毎日決まった時刻に予定通知を送る"""
+
+    def __init__(self, client):
+        self.client = client
+
+    async def _render(self, slot):
+        """送信する日の予定を取得してメッセージを作成 戻り値: (キャッシュ世代, {チャンネルID: テキスト})"""
+        loop = asyncio.get_running_loop()
+        generation = response_cache.generation
+        # サーバーの設定は実行中にも変わるので毎回読み直す
+        targets = get_notify_targets()
+        districts = list(dict.fromkeys(targets.values()))
+        with metrics.stage('scheduler.render'):
+            events_by_district, calendar_status = await loop.run_in_executor(None, collect_events, districts)
+            rendered = {
+                district: render_notification(events_by_district.get(district, []), calendar_status, slot)
+                for district in districts
+            }
+        return generation, {channel_id: rendered[district] for channel_id, district in targets.items()}
+
+    async def _send_channel(self, channel_id, text):
+        channel = await channel_cache.channel(self.client, channel_id)
+        await send_message(channel, text)
+
+    async def _send(self, slot, messages):
+        """メッセージを送信する 戻り値: {チャンネルID: None(成功) または エラー内容}"""
+        if not messages:
+            save_last_sent(slot.date())
+            return {}
+        with metrics.stage('scheduler.send'):
+            results = await deliver_all(messages, self._send_channel)
+        failed = [channel_id for channel_id, error in results.items() if error is not None]
+        print(f"✅ 定時通知を送信しました: {len(results) - len(failed)}/{len(results)}チャンネル")
+        for channel_id in failed:
+            print(f"❌ 定時通知の送信失敗 (ID: {channel_id}): {results[channel_id]}")
+        # 1つも届かなかった場合は送信済みにしない（スクリプト・再起動時の送り直しで送れるように）
+        if len(failed) < len(results):
+            save_last_sent(slot.date())
+        else:
+            metrics.incr('scheduler.send_failed')
+        return results
+
+    async def _run_slot(self, slot):
+        # 送信時刻の少し前（同じ日のうち）にメッセージを作成しておく
+        prerender_at = max(
+            slot - datetime.timedelta(minutes=PRERENDER_MINUTES),
+            datetime.datetime.combine(slot.date(), datetime.time.min, tzinfo=JST),
+        )
+        await _sleep_until(prerender_at)
+        generation, messages = await self._render(slot)
+        print(f"📝 {slot.strftime('%H:%M')} の通知を作成しました")
+
+        await _sleep_until(slot)
+        # 作成後にカレンダーが更新されていたら作り直す
+        if generation != response_cache.generation:
+            generation, messages = await self._render(slot)
+        await self._send(slot, messages)
+
+    async def run(self):
+        """スケジューラ本体（Botの on_ready から1回だけ起動する）"""
+        if not get_notify_targets():
+            print("⚠️ 定時通知の送信先が設定されていません（サーバーの設定が追加されたら送信します）")
+        print(f"⏰ 定時通知スケジューラ開始: 毎日 {NOTIFY_TIME} (JST)")
+
+        # 送信時刻を逃していれば送り直す
+        now = datetime.datetime.now(JST)
+        today_slot = _slot_on(now.date())
+        last_sent = load_last_sent()
+        if today_slot <= now < today_slot + datetime.timedelta(hours=MISSED_RUN_GRACE_HOURS) \
+                and last_sent != today_slot.date():
+            print("🔄 送信時刻を過ぎていたため、今日の通知を送信します")
+            _, messages = await self._render(today_slot)
+            await self._send(today_slot, messages)
+
+        while True:
+            now = datetime.datetime.now(JST)
+            slot = _slot_on(now.date())
+            if slot <= now or load_last_sent() == slot.date():
+                slot = _slot_on(now.date() + datetime.timedelta(days=1))
+            try:
+                await self._run_slot(slot)
+            except Exception as e:
+                print(f"❌ 定時通知エラー: {e}")
+                metrics.incr('scheduler.errors')
+                await asyncio.sleep(60)
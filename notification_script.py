@@ -1,215 +1,198 @@
+import import_timer
+if __name__ == "__main__":
+    # スクリプトとして実行したときだけインポート時間を計測する（他のモジュールからの import では計測しない）
+    import_timer.install()
+
 import asyncio
-import discord
 import os
+import sys
+import time
 import datetime
-import pytz
+import metrics
+from guild_config import district_key
+from notification_core import (
+    IN_PROCESS_NOTIFY, JST, NOTIFY_FORCE, collect_events, deliver_all, get_notify_targets, load_last_sent,
+    render_notification, report_results, save_last_sent
+)
 
-def get_week_of_month(date):
-    """月の第何週目かを取得"""
-    week_number = (date.day - 1) // 7 + 1
-    return week_number
-
-def get_fallback_schedule():
-    """完全フォールバック: 最小限の固定スケジュール"""
-    try:
-        jst = pytz.timezone('Asia/Tokyo')
-        tomorrow = datetime.datetime.now(jst).date() + datetime.timedelta(days=1)
-        weekday = tomorrow.weekday()
-        week_of_month = get_week_of_month(tomorrow)
-        
-        events = []
+async def send_via_gateway(discord_token, messages):
+    """ゲートウェイにログインしてチャンネルに送信する 戻り値: {チャンネルID: None(成功) または エラー内容}"""
+    import discord
+    from client_profile import build_intents, client_options
+    from outbound_queue import send_message
+    
+    # Discord クライアントを設定
+    print("🔧 Discord クライアント設定中...")
+    intents = build_intents(message_content=True)
+    client = discord.Client(intents=intents, **client_options())
+    login_started = time.perf_counter()
+    # ログイン・送信ができなかったチャンネルは失敗として返す
+    results = {channel_id: 'ゲートウェイで送信できませんでした' for channel_id in messages}
+    
+    async def send(channel_id, text):
+        # チャンネルを取得
+        print(f"🔍 チャンネル取得中 (ID: {channel_id})...")
+        channel = client.get_channel(channel_id)
         
-        # 地域のごみ出しスケジュール
-        if weekday == 0:  # 月曜日
-            events.append({
-                'summary': '燃えるごみ',
-                'start': {'date': tomorrow.strftime('%Y-%m-%d')},
-                'source': 'fallback'
-            })
-        elif weekday == 1:  # 火曜日
-            events.append({
-                'summary': 'プラスチックごみ',
-                'start': {'date': tomorrow.strftime('%Y-%m-%d')},
-                'source': 'fallback'
-            })
-        elif weekday == 2:  # 水曜日
-            events.append({
-                'summary': '瓶・缶・ペットボトルごみ',
-                'start': {'date': tomorrow.strftime('%Y-%m-%d')},
-                'source': 'fallback'
-            })
-            # 2週目と4週目は紙ごみも
-            if week_of_month in [2, 4]:
-                events.append({
-                    'summary': '紙ごみ',
-                    'start': {'date': tomorrow.strftime('%Y-%m-%d')},
-                    'source': 'fallback'
-                })
-        elif weekday == 3:  # 木曜日
-            events.append({
-                'summary': '燃えるごみ',
-                'start': {'date': tomorrow.strftime('%Y-%m-%d')},
-                'source': 'fallback'
-            })
+        if not channel:
+            print("⚠️ get_channel で見つからないため fetch_channel を試行...")
+            channel = await client.fetch_channel(channel_id)
         
-        return events
+        print(f"✅ チャンネル見つかりました: {channel.name}")
+        await send_message(channel, text)
+    
+    @client.event
+    async def on_ready():
+        print(f"✅ Discordにログインしました: {client.user}")
+        metrics.observe('discord.login', time.perf_counter() - login_started)
         
-    except Exception:
-        return []
+        try:
+            results.update(await deliver_all(messages, send))
+            report_results(results)
+        except Exception as e:
+            print(f"❌ Discord処理エラー: {str(e)}")
+        finally:
+            print("🔚 Discord接続を終了します")
+            await client.close()
+    
+    # Discord ボットを起動
+    print("🚀 Discord ボット起動中...")
+    try:
+        await client.start(discord_token)
+    except Exception as e:
+        print(f"❌ Discord起動エラー: {str(e)}")
+    return results
+
+async def send_via_rest(discord_token, messages):
+    """ゲートウェイに接続せず HTTP API で送信する 戻り値: {チャンネルID: None(成功) または エラー内容}"""
+    from discord_rest import post_channel_message_async
+    
+    async def send(channel_id, text):
+        await post_channel_message_async(discord_token, channel_id, text)
+    
+    print("📮 HTTP API で送信中...")
+    results = await deliver_all(messages, send)
+    report_results(results)
+    return results
+
+async def send_via_webhook(webhook_messages):
+    """Webhook で送信する 戻り値: {URL: None(成功) または エラー内容}"""
+    from discord_rest import post_webhook_message_async
+    
+    print("📮 Webhook で送信中...")
+    results = await deliver_all(webhook_messages, post_webhook_message_async)
+    report_results(results, 'Webhook')
+    return results
+
+def parse_webhook_targets():
+    """
+    Webhook の送信先と地区を取得
+    NOTIFY_WEBHOOK_URLS="URL[|地区],URL[|地区],..."
+    """
+    targets = {}
+    for entry in (os.getenv('NOTIFY_WEBHOOK_URLS') or '').split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        url, _, region = entry.partition('|')
+        targets[url.strip()] = region.strip() or None
+    return targets
 
 async def send_notification():
-    """ハイブリッドシステムによる予定通知"""
+    """ハイブリッドシステムによる予定通知 戻り値: {送信先: None(成功) または エラー内容}（送信しなかった場合は空）"""
     
     print("🏁 メイン実行開始")
     print("=== ハイブリッド通知スクリプト開始 ===")
     
     # 環境変数の確認
     DISCORD_TOKEN = os.getenv('DISCORD_TOKEN')
-    NOTIFY_CHANNEL_ID_STR = os.getenv('NOTIFY_CHANNEL_ID')
     
     print(f"DISCORD_TOKEN存在: {DISCORD_TOKEN is not None}")
-    print(f"NOTIFY_CHANNEL_ID_STR: {'***' if NOTIFY_CHANNEL_ID_STR else 'None'}")
     
-    if not DISCORD_TOKEN or not NOTIFY_CHANNEL_ID_STR:
-        print("❌ 必要な環境変数が設定されていません")
-        return
+    delivery_mode = os.getenv('NOTIFY_DELIVERY_MODE', 'gateway')
+    print(f"送信方式: {delivery_mode}")
+    
+    # 常駐Botが送る設定、または今日すでに送信済みなら送らない
+    today = datetime.datetime.now(JST).date()
+    if IN_PROCESS_NOTIFY and not NOTIFY_FORCE:
+        print("⏭️ IN_PROCESS_NOTIFY が有効なため、常駐Botが通知を送信します（スクリプトからは送信しません）")
+        return {}
+    if load_last_sent() == today and not NOTIFY_FORCE:
+        print(f"⏭️ {today} の通知は送信済みです")
+        return {}
     
     try:
-        NOTIFY_CHANNEL_ID = int(NOTIFY_CHANNEL_ID_STR)
-        print(f"NOTIFY_CHANNEL_ID: {'***' if NOTIFY_CHANNEL_ID else 'None'}")
+        targets = get_notify_targets()
     except ValueError:
-        print("❌ NOTIFY_CHANNEL_ID が無効な数値です")
-        return
+        print("❌ NOTIFY_CHANNEL_ID(S) が無効な数値です")
+        return {}
+    webhook_targets = {
+        url: district_key(region) for url, region in parse_webhook_targets().items()
+    } if delivery_mode == 'webhook' else {}
+    
+    print(f"送信先チャンネル数: {len(targets)}")
+    
+    if delivery_mode == 'webhook':
+        if not webhook_targets:
+            print("❌ NOTIFY_WEBHOOK_URLS が設定されていません")
+            return {}
+    elif not DISCORD_TOKEN or not targets:
+        print("❌ 必要な環境変数が設定されていません")
+        return {}
     
     # 現在時刻表示
-    jst = pytz.timezone('Asia/Tokyo')
-    current_time = datetime.datetime.now(jst)
+    current_time = datetime.datetime.now(JST)
     print(f"現在時刻: {current_time.strftime('%Y-%m-%d %H:%M:%S')} JST")
     
-    # ハイブリッドシステムで予定取得
-    tomorrow_events = []
-    calendar_status = "✅ 接続成功"
+    # ハイブリッドシステムで予定取得（地区キーごと）
+    districts = list(dict.fromkeys(list(targets.values()) + list(webhook_targets.values())))
+    with metrics.stage('collect_events'):
+        events_by_district, calendar_status = collect_events(districts)
     
-    try:
-        print("📅 ハイブリッドシステム開始...")
-        
-        # google_calendar モジュールをインポート
-        try:
-            import google_calendar
-            print("✅ google_calendar モジュールのインポート成功")
-        except ImportError as e:
-            print(f"❌ google_calendar モジュールのインポートエラー: {e}")
-            # フォールバック: 固定スケジュールのみ
-            tomorrow_events = get_fallback_schedule()
-            calendar_status = "⚠️ 固定スケジュールのみ"
-        else:
-            # ハイブリッドシステムで予定取得
-            tomorrow_events = google_calendar.get_tomorrow_events()
-            calendar_status = "✅ ハイブリッドシステム"
-        
+    # メッセージは地区キーごとに1回だけ作成する
+    rendered = {}
+    for district in districts:
+        tomorrow_events = events_by_district.get(district, [])
+        region, calendar_ids = district
+        print(f"📋 地区: {region or '既定'}{f' (カレンダー: {len(calendar_ids)}個)' if calendar_ids else ''}")
         if tomorrow_events:
             print("📋 取得した予定:")
             for i, event in enumerate(tomorrow_events):
                 source = event.get('source', 'unknown')
-                source_icon = {'google_calendar': '📱', 'fixed_schedule': '📅', 'fallback': '🔄'}
+                source_icon = {'google_calendar': '📱', 'ics': '🗓️', 'fixed_schedule': '📅', 'fallback': '🔄'}
                 print(f"  {i+1}. {source_icon.get(source, '❓')} {event.get('summary', '名前なし')}")
         else:
             print("📭 明日の予定はありません")
-            
-    except Exception as e:
-        print(f"⚠️ ハイブリッドシステム エラー: {str(e)}")
-        # 完全フォールバック
-        tomorrow_events = get_fallback_schedule()
-        calendar_status = "⚠️ フォールバック動作"
+        with metrics.stage('render'):
+            rendered[district] = render_notification(tomorrow_events, calendar_status, current_time)
     
-    # Discord クライアントを設定
-    print("🔧 Discord クライアント設定中...")
-    intents = discord.Intents.default()
-    intents.message_content = True
-    client = discord.Client(intents=intents)
+    messages = {channel_id: rendered[district] for channel_id, district in targets.items()}
     
-    @client.event
-    async def on_ready():
-        print(f"✅ Discordにログインしました: {client.user}")
-        
-        try:
-            # チャンネルを取得
-            print(f"🔍 チャンネル取得中 (ID: {NOTIFY_CHANNEL_ID})...")
-            channel = client.get_channel(NOTIFY_CHANNEL_ID)
-            
-            if not channel:
-                print("⚠️ get_channel で見つからないため fetch_channel を試行...")
-                channel = await client.fetch_channel(NOTIFY_CHANNEL_ID)
-            
-            print(f"✅ チャンネル見つかりました: {channel.name}")
-            
-            # 通知メッセージを作成
-            if tomorrow_events:
-                # 予定ありの場合
-                event_messages = []
-                google_count = 0
-                fixed_count = 0
-                fallback_count = 0
-                
-                for event in tomorrow_events:
-                    source = event.get('source', 'unknown')
-                    if source == 'google_calendar':
-                        google_count += 1
-                        event_messages.append(f"📱 **{event['summary']}**")
-                    elif source == 'fixed_schedule':
-                        fixed_count += 1
-                        event_messages.append(f"📅 **{event['summary']}**")
-                    elif source == 'fallback':
-                        fallback_count += 1
-                        event_messages.append(f"🔄 **{event['summary']}**")
-                    else:
-                        event_messages.append(f"❓ **{event['summary']}**")
-                
-                # システム情報
-                system_info = []
-                if google_count > 0:
-                    system_info.append(f"📱 Google Calendar: {google_count}件")
-                if fixed_count > 0:
-                    system_info.append(f"📅 固定スケジュール: {fixed_count}件")
-                if fallback_count > 0:
-                    system_info.append(f"🔄 フォールバック: {fallback_count}件")
-                
-                notification_text = f"""📅 **明日の予定** ({len(tomorrow_events)}件)
-
-{chr(10).join(event_messages)}
-
-🔄 **システム状況**: {calendar_status}
-📊 **内訳**: {' / '.join(system_info)}
-🕘 **通知時刻**: {current_time.strftime('%Y年%m月%d日 %H:%M')}"""
-                
-                await channel.send(notification_text)
-                print(f"✅ 予定通知を送信しました: {len(tomorrow_events)}件")
-                
-            else:
-                # 予定なしの場合
-                notification_text = f"""📅 **明日の予定**
-
-明日の予定はありません。
-
-🔄 **システム状況**: {calendar_status}
-🕘 **通知時刻**: {current_time.strftime('%Y年%m月%d日 %H:%M')}"""
-                
-                await channel.send(notification_text)
-                print("✅ 予定なし通知を送信しました")
-                
-        except Exception as e:
-            print(f"❌ Discord処理エラー: {str(e)}")
-        finally:
-            print("🔚 Discord接続を終了します")
-            await client.close()
+    if delivery_mode == 'webhook':
+        results = await send_via_webhook({url: rendered[district] for url, district in webhook_targets.items()})
+    else:
+        results = {}
+        if delivery_mode == 'rest':
+            # 失敗したチャンネルだけゲートウェイ経由（get_channel → fetch_channel）で再送する
+            results = await send_via_rest(DISCORD_TOKEN, messages)
+            messages = {channel_id: messages[channel_id] for channel_id, error in results.items() if error is not None}
+            if messages:
+                print(f"🔄 {len(messages)}チャンネルをゲートウェイ経由で再送します")
+        if messages:
+            results.update(await send_via_gateway(DISCORD_TOKEN, messages))
     
-    # Discord ボットを起動
-    print("🚀 Discord ボット起動中...")
-    try:
-        await client.start(DISCORD_TOKEN)
-    except Exception as e:
-        print(f"❌ Discord起動エラー: {str(e)}")
+    # 1つも届かなかった場合は送信済みにしない（次の実行で送り直す）
+    if any(error is None for error in results.values()):
+        save_last_sent(today)
+    else:
+        print("❌ どの送信先にも通知を送信できませんでした")
+    return results
 
 if __name__ == "__main__":
-    asyncio.run(send_notification())
+    results = asyncio.run(send_notification())
+    metrics.emit_summary('notification_script')
+    import_timer.report()
     print("🏁 メイン実行終了")
+    # すべての送信先に送れなかった場合は失敗として終了する（定時実行の失敗として通知されるように）
+    if results and all(error is not None for error in results.values()):
+        sys.exit(1)
@@ -0,0 +1,173 @@
+# outbound_queue.py
+# Botが送信するメッセージのチャンネルごとの送信キュー
+#
+#   - 送信できる状態ならすぐに送り、送信中・レート制限で待っている間に同じチャンネルへ送られたメッセージは1件にまとめて送る
+#     （同時送信数が上限のときは OUTBOUND_COALESCE_SECONDS だけ待ってまとめる）
+#   - Discord の上限（2000文字）を超える分は複数のメッセージに分ける
+#   - チャンネルごとのレート制限（5件/5秒）を送信前に見積もって待ち、429 の場合は retry_after だけ待って再送する
+#   - 同時に送信中のリクエスト数を OUTBOUND_MAX_IN_FLIGHT までに抑える
+import os
+import time
+import asyncio
+import metrics
+
+OUTBOUND_COALESCE_SECONDS = float(os.getenv('OUTBOUND_COALESCE_SECONDS', '0.2'))
+OUTBOUND_MAX_IN_FLIGHT = int(os.getenv('OUTBOUND_MAX_IN_FLIGHT', '4'))
+# チャンネルごとのレート制限（BUCKET_SIZE 件 / BUCKET_SECONDS 秒）
+OUTBOUND_BUCKET_SIZE = 5
+OUTBOUND_BUCKET_SECONDS = 5.0
+OUTBOUND_MAX_RETRIES = 3
+
+MESSAGE_LIMIT = 2000
+# 状態を保持するチャンネル数がこれを超えたら、使われていないものを捨てる
+_MAX_IDLE_CHANNELS = 1024
+
+def split_message(text, limit=MESSAGE_LIMIT):
+    """limit 文字を超えるテキストを、なるべく改行の位置で分ける"""
+    pieces = []
+    while len(text) > limit:
+        cut = text.rfind('\n', 0, limit + 1)
+        if cut <= 0:
+            cut = limit
+        pieces.append(text[:cut])
+        text = text[cut:].lstrip('\n')
+    if text:
+        pieces.append(text)
+    return pieces
+
+def pack_messages(texts, limit=MESSAGE_LIMIT):
+    """複数のテキストを、limit 文字以内のメッセージにできるだけまとめる（改行でつなぐ）"""
+    chunks = []
+    for text in texts:
+        for piece in split_message(text, limit):
+            if chunks and len(chunks[-1]) + 1 + len(piece) <= limit:
+                chunks[-1] += '\n' + piece
+            else:
+                chunks.append(piece)
+    return chunks
+
+class _ChannelState:
+    """1チャンネル分の送信待ちメッセージとレート制限の状態"""
+
+    def __init__(self, bucket_size):
+        self.pending = []
+        self.flusher = None
+        self.tokens = float(bucket_size)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+class OutboundQueue:
+    """チャンネルごとにメッセージをまとめて送信するキュー"""
+
+    def __init__(self, window=OUTBOUND_COALESCE_SECONDS, max_in_flight=OUTBOUND_MAX_IN_FLIGHT,
+                 bucket_size=OUTBOUND_BUCKET_SIZE, bucket_seconds=OUTBOUND_BUCKET_SECONDS):
+        self.window = window
+        self.bucket_size = bucket_size
+        self.bucket_seconds = bucket_seconds
+        self.max_in_flight = max_in_flight
+        # セマフォは実行中のイベントループで作る（Python 3.9 では作成時のループに結び付くため）
+        self._loop = None
+        self._in_flight = None
+        self._channels = {}
+
+    def _bind_loop(self):
+        """実行中のイベントループ用のセマフォを用意する（ループが変わったら状態を作り直す）"""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._in_flight = asyncio.Semaphore(self.max_in_flight)
+            self._channels = {}
+
+    async def send(self, channel, text):
+        """channel（send() を持つチャンネル・ユーザー）にメッセージを送る（まとめた送信が終わるまで待つ）"""
+        self._bind_loop()
+        state = self._channels.get(channel.id)
+        if state is None:
+            if len(self._channels) >= _MAX_IDLE_CHANNELS:
+                self._prune()
+            state = self._channels[channel.id] = _ChannelState(self.bucket_size)
+        future = asyncio.get_running_loop().create_future()
+        state.pending.append((text, future))
+        metrics.incr('outbound.queued')
+        if state.flusher is None:
+            state.flusher = asyncio.create_task(self._flush(channel, state))
+        await future
+
+    def _prune(self):
+        now = time.monotonic()
+        for channel_id, state in list(self._channels.items()):
+            if state.flusher is None and now - state.updated > self.bucket_seconds:
+                del self._channels[channel_id]
+
+    async def _flush(self, channel, state):
+        try:
+            while state.pending:
+                # すぐに送れるなら待たずに送る（送信中に届いたメッセージは次の周回でまとめて送る）
+                # レート制限・同時送信数の上限で待つ間は、続けて送られるメッセージもまとめる
+                wait = self._refill(state)
+                if wait > 0 or self._in_flight.locked():
+                    metrics.incr('outbound.throttled')
+                    await asyncio.sleep(max(wait, self.window))
+                batch, state.pending = state.pending, []
+                chunks = pack_messages([text for text, _ in batch])
+                if len(batch) > len(chunks):
+                    metrics.incr('outbound.coalesced', len(batch) - len(chunks))
+                try:
+                    for chunk in chunks:
+                        await self._post(channel, state, chunk)
+                except Exception as e:
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                else:
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_result(None)
+        finally:
+            state.flusher = None
+
+    def _refill(self, state):
+        """経過時間分の枠を補充し、次に送信できるまでの秒数を返す（すぐに送れるなら 0）"""
+        now = time.monotonic()
+        state.tokens = min(
+            self.bucket_size, state.tokens + (now - state.updated) * self.bucket_size / self.bucket_seconds
+        )
+        state.updated = now
+        wait = state.blocked_until - now
+        if wait <= 0 and state.tokens < 1:
+            wait = (1 - state.tokens) * self.bucket_seconds / self.bucket_size
+        return max(wait, 0)
+
+    async def _acquire(self, state):
+        """チャンネルのレート制限の枠が空くまで待つ"""
+        while True:
+            wait = self._refill(state)
+            if wait <= 0:
+                state.tokens -= 1
+                return
+            metrics.incr('outbound.throttled')
+            await asyncio.sleep(wait)
+
+    async def _post(self, channel, state, text):
+        for attempt in range(OUTBOUND_MAX_RETRIES):
+            await self._acquire(state)
+            async with self._in_flight:
+                try:
+                    with metrics.stage('outbound.send'):
+                        await channel.send(text)
+                    return
+                except Exception as e:
+                    if getattr(e, 'status', None) == 429 and attempt + 1 < OUTBOUND_MAX_RETRIES:
+                        retry_after = getattr(e, 'retry_after', None) or 1.0
+                        print(f"⏳ レート制限のため {retry_after}秒待機")
+                        state.blocked_until = time.monotonic() + retry_after
+                        metrics.incr('outbound.rate_limited')
+                        continue
+                    raise
+
+# Bot全体で共有する送信キュー
+outbound_queue = OutboundQueue()
+
+async def send_message(channel, text):
+    """共有の送信キューでメッセージを送る"""
+    await outbound_queue.send(channel, text)
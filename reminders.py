@@ -0,0 +1,220 @@
+# reminders.py
+# ユーザーごとのリマインダー（指定した種類のごみの前日に、指定した時刻にDMで知らせる）
+#
+# 登録はSQLiteに保持し、送信時刻ごとに登録をまとめてヒープ（優先度付きキュー）で次の送信時刻を管理する
+# 同じ時刻のリマインダーは1回の処理でまとめて送り、予定の取得は地区キーごとに1回だけ行う
+import os
+import json
+import heapq
+import sqlite3
+import asyncio
+import datetime
+import threading
+import metrics
+from calendar_async import get_tomorrow_events_async
+from calendar_integration import resolve_event_type
+from client_profile import channel_cache
+from event_classifier import classify, normalize
+from guild_config import district_key
+from notification_core import JST, deliver_all
+from outbound_queue import send_message
+
+REMINDER_DB_PATH = os.getenv('REMINDER_DB_PATH', 'reminders.db')
+REMINDER_DEFAULT_TIME = os.getenv('REMINDER_DEFAULT_TIME', '20:00')
+# 他のプロセス（別のシャード）で変更された登録を確認する間隔
+REMINDER_RELOAD_SECONDS = 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS subscriptions (
+    user_id INTEGER PRIMARY KEY,
+    categories TEXT NOT NULL,
+    remind_time TEXT NOT NULL,
+    region TEXT,
+    calendar_ids TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_subscriptions_remind_time ON subscriptions (remind_time);
+"""
+
+def parse_remind_time(value):
+    """'7:00' などを 'HH:MM' に揃える（不正な値は ValueError）"""
+    hour, minute = value.split(':')
+    return datetime.time(int(hour), int(minute)).strftime('%H:%M')
+
+def event_matches(event, event_type):
+    """予定が種類（'紙' など）に当てはまるか（件名の部分一致、またはカテゴリの一致）"""
+    query = resolve_event_type(event_type)
+    summary = event.get('summary', '')
+    if normalize(query) in normalize(summary):
+        return True
+    category = classify(query)
+    return category is not None and category == classify(summary)
+
+class ReminderStore:
+    """リマインダーの登録（SQLite）"""
+
+    def __init__(self, path=REMINDER_DB_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(_SCHEMA)
+
+    @staticmethod
+    def _row_to_subscription(row):
+        calendar_ids = json.loads(row['calendar_ids']) if row['calendar_ids'] else None
+        return {
+            'user_id': row['user_id'],
+            'categories': json.loads(row['categories']),
+            'remind_time': row['remind_time'],
+            'district': district_key(row['region'], calendar_ids),
+        }
+
+    def subscribe(self, user_id, categories, remind_time, district):
+        """登録・更新する（1ユーザー1件）"""
+        region, calendar_ids = district
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO subscriptions VALUES (?, ?, ?, ?, ?)",
+                (user_id, json.dumps(categories, ensure_ascii=False), remind_time, region,
+                 json.dumps(list(calendar_ids)) if calendar_ids else None)
+            )
+
+    def unsubscribe(self, user_id):
+        """登録を削除する 戻り値: 削除したか"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute("DELETE FROM subscriptions WHERE user_id = ?", (user_id,))
+        return cursor.rowcount > 0
+
+    def get(self, user_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM subscriptions WHERE user_id = ?", (user_id,)).fetchone()
+        return self._row_to_subscription(row) if row else None
+
+    def by_time(self):
+        """送信時刻ごとの登録 {'HH:MM': [登録]}"""
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM subscriptions ORDER BY remind_time").fetchall()
+        slots = {}
+        for row in rows:
+            slots.setdefault(row['remind_time'], []).append(self._row_to_subscription(row))
+        return slots
+
+    def data_version(self):
+        """他の接続が変更をコミットすると変わる値"""
+        with self._lock:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def _next_fire(remind_time, now):
+    """now より後で最初の送信時刻"""
+    hour, minute = map(int, remind_time.split(':'))
+    when = datetime.datetime.combine(now.date(), datetime.time(hour, minute, tzinfo=JST))
+    if when <= now:
+        when += datetime.timedelta(days=1)
+    return when
+
+def render_reminder(events):
+    """リマインダーのDM本文"""
+    lines = [f"🔔 明日は{event['summary']}の日です" for event in events]
+    return "\n".join(lines)
+
+class ReminderScheduler:
+    """リマインダーを送信時刻に送る（送信時刻ごとに1件のヒープで管理する）"""
+
+    def __init__(self, client, store=None):
+        self.client = client
+        self.store = store or get_reminder_store()
+        self._slots = {}
+        self._heap = []
+        self._scheduled = set()
+        self._data_version = None
+        self._wakeup = asyncio.Event()
+
+    def notify_changed(self):
+        """このプロセスで登録が変わったときに呼ぶ（次の送信時刻を計算し直す）"""
+        self._data_version = None
+        self._wakeup.set()
+
+    def _reload(self, now):
+        """登録を読み込み直し、ヒープにない送信時刻を追加する"""
+        self._data_version = self.store.data_version()
+        self._slots = self.store.by_time()
+        for remind_time in self._slots:
+            if remind_time not in self._scheduled:
+                heapq.heappush(self._heap, (_next_fire(remind_time, now), remind_time))
+                self._scheduled.add(remind_time)
+        metrics.set_gauge('reminders.subscriptions', sum(len(subs) for subs in self._slots.values()))
+
+    async def _send_dm(self, user_id, text):
+        user = await channel_cache.user(self.client, user_id)
+        await send_message(user, text)
+
+    async def _fire(self, remind_time):
+        """同じ送信時刻のリマインダーをまとめて送る"""
+        subscriptions = self._slots.get(remind_time, [])
+        if not subscriptions:
+            return
+        with metrics.stage('reminders.render'):
+            districts = list(dict.fromkeys(sub['district'] for sub in subscriptions))
+            events_by_district = dict(zip(districts, await asyncio.gather(
+                *(get_tomorrow_events_async(district) for district in districts)
+            )))
+            messages = {}
+            for sub in subscriptions:
+                events = [
+                    event for event in events_by_district[sub['district']]
+                    if any(event_matches(event, category) for category in sub['categories'])
+                ]
+                if events:
+                    messages[sub['user_id']] = render_reminder(events)
+        if not messages:
+            return
+        with metrics.stage('reminders.send'):
+            results = await deliver_all(messages, self._send_dm)
+        failed = sum(1 for error in results.values() if error is not None)
+        print(f"🔔 {remind_time} のリマインダーを送信しました: {len(results) - failed}/{len(results)}人")
+        metrics.incr('reminders.sent', len(results) - failed)
+
+    async def run(self):
+        """スケジューラ本体（Botの on_ready から1回だけ起動する）"""
+        print("🔔 リマインダースケジューラ開始")
+        while True:
+            now = datetime.datetime.now(JST)
+            if self._data_version is None or self.store.data_version() != self._data_version:
+                self._reload(now)
+
+            # 送信時刻になったものを処理し、翌日の同じ時刻を入れ直す（登録がなくなった時刻は捨てる）
+            while self._heap and self._heap[0][0] <= now:
+                _, remind_time = heapq.heappop(self._heap)
+                if remind_time not in self._slots:
+                    self._scheduled.discard(remind_time)
+                    continue
+                try:
+                    await self._fire(remind_time)
+                except Exception as e:
+                    print(f"❌ リマインダー送信エラー ({remind_time}): {e}")
+                    metrics.incr('reminders.errors')
+                heapq.heappush(self._heap, (_next_fire(remind_time, now), remind_time))
+
+            timeout = REMINDER_RELOAD_SECONDS
+            if self._heap:
+                timeout = min(timeout, max((self._heap[0][0] - datetime.datetime.now(JST)).total_seconds(), 0))
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+# グローバルインスタンス
+reminder_store = None
+_store_lock = threading.Lock()
+
+def get_reminder_store():
+    """ReminderStoreのシングルトンインスタンスを取得"""
+    global reminder_store
+    with _store_lock:
+        if reminder_store is None:
+            reminder_store = ReminderStore()
+        return reminder_store
@@ -0,0 +1,70 @@
+# response_cache.py
+# Botコマンドの応答を保持する TTL 付き LRU キャッシュ
+import os
+import time
+import threading
+from collections import OrderedDict
+import metrics
+
+RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', '600'))
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', '256'))
+
+_MISSING = object()
+
+class TTLCache:
+    """有効期限（ttl 秒）と最大件数（maxsize、超えたら最も古く使われたものを捨てる）を持つキャッシュ"""
+
+    def __init__(self, maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        # clear() のたびに増える（取得中に破棄された古い結果を登録しないため）
+        self.generation = 0
+
+    def get(self, key, default=None):
+        """値を取得（期限切れ・未登録なら default）"""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                metrics.incr('response_cache.miss')
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                metrics.incr('response_cache.expired')
+                return default
+            self._data.move_to_end(key)
+            metrics.incr('response_cache.hit')
+            return value
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def set(self, key, value, generation=None):
+        """値を登録（generation を指定した場合、その後に clear() されていれば登録しない）"""
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """すべて破棄"""
+        with self._lock:
+            self._data.clear()
+            self.generation += 1
+
+    def __len__(self):
+        return len(self._data)
+
+# Botコマンド用の共有キャッシュ
+response_cache = TTLCache()
+
+def invalidate_all(reason=''):
+    """カレンダーが更新されたときにキャッシュを破棄する"""
+    response_cache.clear()
+    metrics.incr('response_cache.invalidated')
+    print(f"🧹 応答キャッシュを破棄しました{f' ({reason})' if reason else ''}")
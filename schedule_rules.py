@@ -0,0 +1,144 @@
+# schedule_rules.py
+# ごみ出しの固定スケジュールをデータファイルから読み込み、日付引きの表にコンパイルするルールエンジン
+#
+# ルールの種類:
+#   毎週        {"summary": "燃えるごみ", "weekdays": ["月", "木"]}
+#   第n週       {"summary": "紙ごみ", "weekdays": ["水"], "weeks": [2, 4]}
+#   例外日      {"date": "2025-12-31", "summary": "燃えるごみ", "action": "remove"}  (action: add / remove)
+import os
+import json
+import datetime
+import threading
+
+SCHEDULE_RULES_PATH = os.getenv(
+    'SCHEDULE_RULES_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schedule_rules.json')
+)
+SCHEDULE_REGION = os.getenv('SCHEDULE_REGION')
+
+# コンパイルする期間（日数）
+HORIZON_DAYS = 366
+
+WEEKDAY_NAMES = ['月', '火', '水', '木', '金', '土', '日']
+
+def get_week_of_month(date):
+    """月の第何週目かを取得（1=第1週, 2=第2週, 3=第3週, 4=第4週, 5=第5週）"""
+    return (date.day - 1) // 7 + 1
+
+def _parse_weekday(value):
+    """曜日（'月' などの名前、または 0=月曜日 の数値）を数値に変換"""
+    if isinstance(value, int):
+        return value
+    return WEEKDAY_NAMES.index(value.removesuffix('曜日'))
+
+class Schedule:
+    """1地区分のルールと、それをコンパイルした日付→予定の表"""
+
+    def __init__(self, name, rules, exceptions=None, horizon_days=HORIZON_DAYS):
+        self.name = name
+        self.horizon_days = horizon_days
+        # 曜日 → [(summary, type, weeks)] に前処理しておく
+        self._by_weekday = [[] for _ in WEEKDAY_NAMES]
+        for rule in rules:
+            weeks = frozenset(rule['weeks']) if rule.get('weeks') else None
+            rule_type = rule.get('type', 'weekly' if weeks is None else 'monthly')
+            for weekday in rule['weekdays']:
+                self._by_weekday[_parse_weekday(weekday)].append((rule['summary'], rule_type, weeks))
+        self._exceptions = {}
+        for exception in exceptions or []:
+            date = datetime.date.fromisoformat(exception['date'])
+            self._exceptions.setdefault(date, []).append(exception)
+        self._table = {}
+        self._start = None
+        self._end = None
+
+    def compile(self, start_date):
+        """start_date から horizon_days 日分の表を作成する"""
+        table = {}
+        for offset in range(self.horizon_days):
+            date = start_date + datetime.timedelta(days=offset)
+            week = get_week_of_month(date)
+            entries = [
+                (summary, rule_type)
+                for summary, rule_type, weeks in self._by_weekday[date.weekday()]
+                if weeks is None or week in weeks
+            ]
+            for exception in self._exceptions.get(date, []):
+                if exception.get('action', 'add') == 'remove':
+                    entries = [entry for entry in entries if entry[0] != exception['summary']]
+                else:
+                    entries.append((exception['summary'], exception.get('type', 'exception')))
+            if entries:
+                table[date] = tuple(entries)
+        self._table = table
+        self._start = start_date
+        self._end = start_date + datetime.timedelta(days=self.horizon_days)
+
+    def entries_on(self, date):
+        """指定日の (summary, type) 一覧を取得（表の範囲外なら作り直す）"""
+        if self._start is None or not (self._start <= date < self._end):
+            self.compile(date)
+        return self._table.get(date, ())
+
+    def events_on(self, date, source='fixed_schedule'):
+        """指定日の予定をイベント形式で取得"""
+        date_str = date.strftime('%Y-%m-%d')
+        return [
+            {'summary': summary, 'start': {'date': date_str}, 'source': source, 'type': rule_type}
+            for summary, rule_type in self.entries_on(date)
+        ]
+
+    def events_between(self, start_date, end_date, source='fixed_schedule'):
+        """日付範囲（両端を含む）の予定を日付ごとに取得"""
+        days = {}
+        date = start_date
+        while date <= end_date:
+            days[date] = self.events_on(date, source)
+            date += datetime.timedelta(days=1)
+        return days
+
+_lock = threading.Lock()
+_rules_data = None
+_schedules = {}
+
+def load_rules(path=None):
+    """ルールファイルを読み込む"""
+    with open(path or SCHEDULE_RULES_PATH, encoding='utf-8') as f:
+        return json.load(f)
+
+def _resolve_region(region):
+    """地区名を確定する（None は SCHEDULE_REGION、なければルールファイルの既定の地区）"""
+    return region or SCHEDULE_REGION or _rules_data.get('default_region', 'default')
+
+def resolve_region(region=None):
+    """地区名を確定する（None と既定の地区名を同じものとして扱うため）"""
+    global _rules_data
+    with _lock:
+        if _rules_data is None:
+            _rules_data = load_rules()
+        return _resolve_region(region)
+
+def get_schedule(region=None):
+    """地区のスケジュールを取得（地区ごとに1回だけ構築）"""
+    global _rules_data
+    with _lock:
+        if _rules_data is None:
+            _rules_data = load_rules()
+        region = _resolve_region(region)
+        schedule = _schedules.get(region)
+        if schedule is None:
+            region_data = _rules_data['regions'][region]
+            schedule = Schedule(
+                region_data.get('name', region),
+                region_data.get('rules', []),
+                region_data.get('exceptions', []),
+            )
+            _schedules[region] = schedule
+        return schedule
+
+def get_regions():
+    """定義済みの地区一覧を取得"""
+    global _rules_data
+    with _lock:
+        if _rules_data is None:
+            _rules_data = load_rules()
+        return list(_rules_data['regions'])
@@ -0,0 +1,81 @@
+# shard_launcher.py
+# Botのシャードを複数のワーカープロセスに振り分けて起動する
+#
+#   SHARD_COUNT      全体のシャード数（未設定なら Discord の推奨値）
+#   SHARD_PROCESSES  ワーカープロセス数（未設定なら CPU コア数、シャード数より多くはしない）
+#   LOCAL_HTTP_PORT  設定した場合、ワーカー i はポート LOCAL_HTTP_PORT + i を使う
+#
+# ワーカー i はシャード i, i + プロセス数, i + 2×プロセス数, ... を担当する
+# 異常終了したワーカーは少し待ってから起動し直す
+import os
+import sys
+import time
+import signal
+import subprocess
+import config
+from discord_rest import get_gateway_bot
+
+RESTART_DELAY_SECONDS = 5
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'discordbot.py')
+
+def get_shard_count():
+    """全体のシャード数（SHARD_COUNT、なければ Discord の推奨値）"""
+    if os.getenv('SHARD_COUNT', 'auto') != 'auto':
+        return int(os.getenv('SHARD_COUNT'))
+    shard_count = get_gateway_bot(config.DISCORD_TOKEN)['shards']
+    print(f"📡 Discord の推奨シャード数: {shard_count}")
+    return shard_count
+
+def assign_shards(shard_count, processes):
+    """シャードをワーカーに振り分ける 戻り値: [ワーカーごとのシャードID一覧]"""
+    processes = max(1, min(processes, shard_count))
+    return [list(range(worker, shard_count, processes)) for worker in range(processes)]
+
+def _start_worker(worker, shard_ids, shard_count):
+    env = dict(os.environ)
+    env['SHARD_IDS'] = ','.join(map(str, shard_ids))
+    env['SHARD_COUNT'] = str(shard_count)
+    if os.getenv('LOCAL_HTTP_PORT'):
+        env['LOCAL_HTTP_PORT'] = str(int(os.getenv('LOCAL_HTTP_PORT')) + worker)
+    print(f"🚀 ワーカー{worker} 起動: シャード {shard_ids}")
+    return subprocess.Popen([sys.executable, BOT_SCRIPT], env=env)
+
+def main():
+    shard_count = get_shard_count()
+    processes = int(os.getenv('SHARD_PROCESSES') or os.cpu_count() or 1)
+    assignments = assign_shards(shard_count, processes)
+    print(f"🧩 シャード数: {shard_count} / ワーカー数: {len(assignments)}")
+
+    workers = {
+        worker: _start_worker(worker, shard_ids, shard_count)
+        for worker, shard_ids in enumerate(assignments)
+    }
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for process in workers.values():
+            process.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while not stopping:
+        time.sleep(1)
+        for worker, process in list(workers.items()):
+            returncode = process.poll()
+            if returncode is None or stopping:
+                continue
+            print(f"⚠️ ワーカー{worker} が終了しました (終了コード: {returncode})")
+            time.sleep(RESTART_DELAY_SECONDS)
+            if not stopping:
+                workers[worker] = _start_worker(worker, assignments[worker], shard_count)
+
+    for process in workers.values():
+        process.wait()
+    print("🔚 すべてのワーカーを終了しました")
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,10 @@
 # token_refresh.py
 import os
-import json
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
+import sys
+import metrics
+from calendar_service import (
+    TOKEN_PATH, load_user_credentials, refresh_credentials, run_authorization_flow
+)
 
 def refresh_google_token():
     """Google Calendar APIトークンをリフレッシュ"""
@@ -16,17 +18,16 @@ def refresh_google_token():
     print("✅ credentials.json確認完了")
     
     # token.jsonの存在確認
-    if not os.path.exists("token.json"):
+    if not os.path.exists(TOKEN_PATH):
         print("❌ token.jsonが見つかりません")
-        print("💡 初回認証が必要です。ローカルでgoogle_calendar.pyを実行してください。")
+        print("💡 初回認証が必要です。ローカルで python token_refresh.py --authorize を実行してください。")
         return False
     
     print("✅ token.json確認完了")
     
     try:
-        # 既存のトークンを読み込み
-        SCOPES = ["https://www.googleapis.com/auth/calendar.readonly"]
-        creds = Credentials.from_authorized_user_file("token.json", SCOPES)
+        # 既存のトークンを読み込み（スコープは token.json に記録されたものを使う）
+        creds = load_user_credentials()
         
         print(f"トークン有効性: {creds.valid}")
         print(f"トークン期限切れ: {creds.expired}")
@@ -35,17 +36,14 @@ def refresh_google_token():
         if creds and creds.expired and creds.refresh_token:
             print("🔄 リフレッシュトークンを使用してトークンを更新中...")
             
-            # トークンをリフレッシュ
-            creds.refresh(Request())
-            
-            # 更新されたトークンを保存
-            with open("token.json", "w") as token:
-                token.write(creds.to_json())
+            # トークンをリフレッシュし、token.json とトークンキャッシュを置き換えで保存
+            with metrics.stage('token.refresh'):
+                refresh_credentials(f"user:{creds.client_id}", creds, force=True)
             
             print("✅ トークンリフレッシュ成功")
             
             # 更新されたトークンの内容を表示
-            with open("token.json", "r") as token:
+            with open(TOKEN_PATH, "r") as token:
                 token_content = token.read()
                 print("\n" + "="*50)
                 print("新しいトークン（GitHub Secretsにコピーしてください）:")
@@ -59,7 +57,7 @@ def refresh_google_token():
             print("✅ トークンは既に有効です")
             
             # 現在のトークンの内容を表示
-            with open("token.json", "r") as token:
+            with open(TOKEN_PATH, "r") as token:
                 token_content = token.read()
                 print("\n" + "="*50)
                 print("現在のトークン（確認用）:")
@@ -71,7 +69,7 @@ def refresh_google_token():
         
         else:
             print("❌ トークンが無効で、リフレッシュトークンもありません")
-            print("💡 再認証が必要です。ローカルでgoogle_calendar.pyを実行してください。")
+            print("💡 再認証が必要です。ローカルで python token_refresh.py --authorize を実行してください。")
             return False
             
     except Exception as e:
@@ -82,7 +80,14 @@ def refresh_google_token():
 
 if __name__ == "__main__":
     print("🏁 トークンリフレッシュスクリプト開始")
-    success = refresh_google_token()
+    if '--authorize' in sys.argv:
+        # 初回認証（ブラウザでの OAuth フロー）
+        print("🔐 ブラウザで認証を行います...")
+        run_authorization_flow()
+        print("✅ token.json を作成しました")
+    with metrics.stage('token_refresh_script'):
+        success = refresh_google_token()
+    metrics.emit_summary('token_refresh')
     if success:
         print("🎉 トークンリフレッシュ完了")
     else: